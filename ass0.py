@@ -2,14 +2,23 @@ import tkinter as tk
 from tkinter import filedialog, simpledialog, messagebox
 from PIL import Image, ImageTk
 
+import instrument
+from jobs import JobRunner, JobBar
+# The resampling kernels live in imagecore.resample; re-exported here for existing callers.
+from imagecore.resample import (
+    build_pyramid, fit_size, pyramid_level, render_fit, render_reduced, channel_previews)
+
 class ImageProcessorApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Image Spatial Frequency and Color Channel Visualization")
         self.original_image = None
+        self.pyramid = None
         self.tk_image = None
         self.canvas_width = 800
         self.canvas_height = 600
+        # Opening (decode and pyramid) runs as a background job.
+        self.jobs = JobRunner(root)
 
         self.canvas = tk.Canvas(root, width=self.canvas_width, height=self.canvas_height, bg="gray")
         self.canvas.pack(pady=10)
@@ -29,6 +38,14 @@ class ImageProcessorApp:
         self.reduce_button = tk.Button(button_frame, text="3. Reduce Spatial Resolution", command=self.reduce_resolution, state=tk.DISABLED)
         self.reduce_button.pack(side=tk.LEFT, padx=10)
 
+        self.scale_var = tk.IntVar(value=100)
+        self.scale_slider = tk.Scale(root, from_=1, to=100, orient=tk.HORIZONTAL, length=400,
+                                     label="Resolution (%)", variable=self.scale_var,
+                                     command=self.on_scale_change, state=tk.DISABLED)
+        self.scale_slider.pack(pady=5)
+        JobBar(root, self.jobs).pack(pady=2)
+        self.status = instrument.status_bar(root)
+
     def open_image(self):
         
         file_path = filedialog.askopenfilename(
@@ -37,28 +54,48 @@ class ImageProcessorApp:
         if not file_path:
             return
 
-        try:
-            self.original_image = Image.open(file_path)
-            self.display_image(self.original_image)
-            
-            self.rgb_button.config(state=tk.NORMAL)
-            self.reduce_button.config(state=tk.NORMAL)
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to open image: {e}")
+        self.jobs.submit("Open image", self.read_image, file_path, (self.canvas_width, self.canvas_height),
+                         on_done=self.show_opened,
+                         on_error=lambda e: messagebox.showerror("Error", f"Failed to open image: {e}"))
+
+    def read_image(self, file_path, box):
+        # Job thread: decode, build the pyramid and fit the view to the canvas.
+        with instrument.stage("decode") as st:
+            image = Image.open(file_path)
+            image.load()
+            st.record(image)
+        with instrument.stage("pyramid"):
+            pyramid = build_pyramid(image)
+        with instrument.stage("fit to canvas"):
+            fitted = render_fit(pyramid, box)
+        return image, pyramid, fitted
+
+    def show_opened(self, opened):
+        self.original_image, self.pyramid, fitted = opened
+        self.scale_var.set(100)
+        self.display_image(fitted)
+        
+        self.rgb_button.config(state=tk.NORMAL)
+        self.reduce_button.config(state=tk.NORMAL)
+        self.scale_slider.config(state=tk.NORMAL)
 
     def display_image(self, image_to_display):
         # Scale the image to fit within the canvas while maintaining aspect ratio
-        img_width, img_height = image_to_display.size
-        ratio = min(self.canvas_width / img_width, self.canvas_height / img_height)
-        new_width = int(img_width * ratio)
-        new_height = int(img_height * ratio)
-
-        resized_image = image_to_display.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        self.tk_image = ImageTk.PhotoImage(resized_image)
+        box = (self.canvas_width, self.canvas_height)
+        with instrument.stage("fit to canvas"):
+            if image_to_display is self.original_image and self.pyramid is not None:
+                resized_image = render_fit(self.pyramid, box)
+            elif image_to_display.size == fit_size(image_to_display.size, box):
+                resized_image = image_to_display
+            else:
+                resized_image = image_to_display.resize(fit_size(image_to_display.size, box), Image.Resampling.LANCZOS)
+        with instrument.stage("PhotoImage"):
+            self.tk_image = ImageTk.PhotoImage(resized_image)
         
         self.canvas.delete("all")
         self.canvas.create_image(self.canvas_width / 2, self.canvas_height / 2, image=self.tk_image, anchor=tk.CENTER)
 
+    @instrument.traced("Show RGB channels")
     def show_rgb_channels(self):
 
         if not self.original_image:
@@ -66,20 +103,15 @@ class ImageProcessorApp:
             return
 
         
-        bands = self.original_image.split()
-        if len(bands) < 3:
-            messagebox.showwarning("Warning", "The loaded image does not have RGB channels.")
+        # Channel views are built from one display-size copy, never at full size.
+        try:
+            with instrument.stage("channels") as st:
+                red_image, green_image, blue_image = channel_previews(
+                    self.pyramid, (self.canvas_width, self.canvas_height))
+                st.record(red_image, green_image, blue_image)
+        except ValueError as e:
+            messagebox.showwarning("Warning", str(e))
             return
-        
-        red_band = bands[0]
-        green_band = bands[1]
-        blue_band = bands[2]
-
-        blank_band = Image.new('L', self.original_image.size)
-        
-        red_image = Image.merge("RGB", (red_band, blank_band, blank_band))
-        green_image = Image.merge("RGB", (blank_band, green_band, blank_band))
-        blue_image = Image.merge("RGB", (blank_band, blank_band, blue_band))
 
         
         self.display_channel(red_image, "Red Channel")
@@ -91,13 +123,11 @@ class ImageProcessorApp:
         channel_window = tk.Toplevel(self.root)
         channel_window.title(title)
         
-        img_width, img_height = channel_image.size
-        ratio = min(self.canvas_width / img_width, self.canvas_height / img_height)
-        new_width = int(img_width * ratio)
-        new_height = int(img_height * ratio)
-        resized_image = channel_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        new_size = fit_size(channel_image.size, (self.canvas_width, self.canvas_height))
+        resized_image = channel_image if channel_image.size == new_size else channel_image.resize(new_size, Image.Resampling.LANCZOS)
         
-        tk_img = ImageTk.PhotoImage(resized_image)
+        with instrument.stage("PhotoImage"):
+            tk_img = ImageTk.PhotoImage(resized_image)
 
         channel_canvas = tk.Canvas(channel_window, width=self.canvas_width, height=self.canvas_height, bg="gray")
         channel_canvas.pack()
@@ -120,25 +150,32 @@ class ImageProcessorApp:
             if scale_percent is None:
                 return
 
-            reduction_factor = scale_percent / 100.0
-            new_width = int(self.original_image.width * reduction_factor)
-            new_height = int(self.original_image.height * reduction_factor)
-
-            if new_width <= 0 or new_height <= 0:
-                messagebox.showerror("Error", "Invalid reduction percentage.")
-                return
-
-            # Downsample the image to a smaller size
-            low_res_image = self.original_image.resize((new_width, new_height), Image.Resampling.BOX)
-            
-            # Upsample back to original size using nearest neighbor
-            restored_image = low_res_image.resize(self.original_image.size, Image.Resampling.NEAREST)
-
-            self.display_image(restored_image)
+            self.scale_var.set(scale_percent)
+            self.show_reduced(scale_percent)
 
         except (ValueError, TypeError):
             messagebox.showerror("Error", "Invalid input. Please enter a valid number.")
 
+    def on_scale_change(self, value):
+        if self.pyramid is None:
+            return
+        try:
+            self.show_reduced(int(float(value)))
+        except ValueError:
+            pass
+
+    @instrument.traced("Reduce resolution")
+    def show_reduced(self, scale_percent):
+        # Downsample from the nearest pyramid level and upsample (nearest
+        # neighbour) straight to the canvas size.
+        try:
+            with instrument.stage("render reduced"):
+                restored_image = render_reduced(self.pyramid, scale_percent, (self.canvas_width, self.canvas_height))
+        except ValueError:
+            messagebox.showerror("Error", "Invalid reduction percentage.")
+            return
+        self.display_image(restored_image)
+
 if __name__ == "__main__":
     root = tk.Tk()
     app = ImageProcessorApp(root)
@@ -1,131 +1,164 @@
+import weakref
+from collections import OrderedDict
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import cv2
 import numpy as np
 from PIL import Image, ImageTk
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 
-
-def to_uint8(arr):
-    a = np.asarray(arr)
-    a = np.clip(a, 0, 255)
-    return a.astype(np.uint8)
-
-def load_gray(path):
-    img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
-    if img is None:
-        raise IOError("Could not read image.")
-    return to_uint8(img)
+import instrument
+from jobs import JobRunner, JobBar
+# The kernels live in imagecore.gray; they are re-exported here for existing callers.
+from imagecore.gray import (
+    to_uint8, load_gray, calc_hist, cdf_from_hist, IDENTITY_LUT, LEVELS, hist_min_max,
+    propagate_hist, ImageStats, linear_stretch_lut, slide_lut, piecewise_linear_lut,
+    percentile_stretch_lut, equalize_lut, specification_lut, TARGET_CDF_CACHE_SIZE,
+    target_cdf, linear_stretch, linear_map_custom, shrink_map, slide,
+    piecewise_linear, percentile_hist_stretch, histogram_equalize,
+    histogram_specification_map, apply_mapping, GrayImage, POINT_OPS, PointChain, EditHistory,
+    levels_for, rebin_hist, save_gray, top_bits_uint8)
+from imagecore.clahe import adaptive_equalize
+
+
+def preview_8bit(img16, maxsize=(700,700)):
+    # Shrink while still 16-bit (cv2 handles uint16), then keep the top 8 of
+    # the bits actually in use, so 12-bit data is not shown nearly black.
+    h, w = img16.shape
+    scale = min(maxsize[0]/w, maxsize[1]/h, 1.0)
+    if scale < 1:
+        with instrument.stage("preview resize") as st:
+            img16 = cv2.resize(img16, (int(w*scale), int(h*scale)), interpolation=cv2.INTER_AREA)
+            st.record(img16)
+    return top_bits_uint8(img16)
 
 def pil_from_np_gray(np_img, maxsize=(700,700)):
+    if np_img.dtype == np.uint16:
+        np_img = preview_8bit(np_img, maxsize)
     pil = Image.fromarray(np_img)
     w,h = pil.size
     mw, mh = maxsize
     if w>mw or h>mh:
         scale = min(mw/w, mh/h)
-        pil = pil.resize((int(w*scale), int(h*scale)), Image.LANCZOS)
-    return ImageTk.PhotoImage(pil)
-
-def calc_hist(img):
-    hist = cv2.calcHist([img],[0],None,[256],[0,256]).flatten()
-    return hist
-
-def plot_hist_on_axes(ax, img, title="Histogram"):
-    ax.clear()
-    hist = calc_hist(img)
-    ax.plot(hist, color='black')
-    ax.set_title(title)
-    ax.set_xlim(0,255)
-    ax.set_xlabel("Intensity")
-    ax.set_ylabel("Frequency")
-
-def cdf_from_hist(hist):
-    pdf = hist.astype(np.float64) / (np.sum(hist) + 1e-12)
-    cdf = np.cumsum(pdf)
-    return cdf
-
-
-def linear_stretch(img, dst_min=0, dst_max=255):
-    arr = img.astype(np.float32)
-    src_min = float(np.min(arr))
-    src_max = float(np.max(arr))
-    if src_max == src_min:
-        return to_uint8(np.clip(arr, dst_min, dst_max))
-    out = (arr - src_min) / (src_max - src_min) * (dst_max - dst_min) + dst_min
-    return to_uint8(out)
-
-def linear_map_custom(img, src_min, src_max, dst_min, dst_max):
-    arr = img.astype(np.float32)
-    if src_max == src_min:
-        return to_uint8(np.clip(arr, dst_min, dst_max))
-    out = (arr - src_min) / (src_max - src_min) * (dst_max - dst_min) + dst_min
-    return to_uint8(out)
-
-def shrink_map(img, dst_min, dst_max):
-    return linear_stretch(img, dst_min, dst_max)
-
-def slide(img, offset):
-    return to_uint8(img.astype(np.int32) + int(offset))
-
-def piecewise_linear(img, thresh, low_dst=(0,127), high_dst=(128,255)):
-    arr = img.astype(np.float32)
-    t = float(thresh)
-    out = np.zeros_like(arr)
-    src_min = float(np.min(arr))
-    src_max = float(np.max(arr))
-    # Lower segment mapping: [src_min, t] -> low_dst
-    lo_src_lo = src_min
-    lo_src_hi = min(t, src_max)  
-    if lo_src_hi <= lo_src_lo:
-        mask_low = arr <= t
-        out[mask_low] = low_dst[0]
-    else:
-        mask_low = arr <= t
-        out[mask_low] = (arr[mask_low] - lo_src_lo) / (lo_src_hi - lo_src_lo) * (low_dst[1] - low_dst[0]) + low_dst[0]
-    # Upper segment mapping: (t, src_max] -> high_dst
-    hi_src_lo = max(t+1, src_min)
-    hi_src_hi = src_max
-    mask_high = arr > t
-    if hi_src_hi <= hi_src_lo:
-        out[mask_high] = high_dst[1]
-    else:
-        out[mask_high] = (arr[mask_high] - hi_src_lo) / (hi_src_hi - hi_src_lo) * (high_dst[1] - high_dst[0]) + high_dst[0]
-    return to_uint8(out)
-
-def percentile_hist_stretch(img, low_pct=2.0, high_pct=98.0, out_min=0, out_max=255):
-    flat = img.flatten().astype(np.float32)
-    lo = np.percentile(flat, low_pct)
-    hi = np.percentile(flat, high_pct)
-    if hi == lo:
-        return to_uint8(img)
-    out = (img.astype(np.float32) - lo) / (hi - lo) * (out_max - out_min) + out_min
-    return to_uint8(out)
-
-def histogram_equalize(img):
-    return cv2.equalizeHist(img)
-
-
-def histogram_specification_map(src_img, target_img):
-    
-    hist_src = calc_hist(src_img)
-    hist_tgt = calc_hist(target_img)
-    cdf_src = cdf_from_hist(hist_src)
-    cdf_tgt = cdf_from_hist(hist_tgt)
-    mapping = np.zeros(256, dtype=np.uint8)
-    # For each intensity level in source, find corresponding level in target
-    for r in range(256):
-        # Find the smallest s such that cdf_tgt[s] >= cdf_src[r]
-        target_indices = np.where(cdf_tgt >= cdf_src[r])[0]
-        if target_indices.size > 0:
-            s = target_indices[0]
-        else:
-            s = 255
-        mapping[r] = s
-    return mapping
-
-def apply_mapping(img, mapping):
-    return mapping[img]
+        with instrument.stage("preview resize") as st:
+            pil = pil.resize((int(w*scale), int(h*scale)), Image.LANCZOS)
+            st.record(pil)
+    with instrument.stage("PhotoImage"):
+        return ImageTk.PhotoImage(pil)
+
+class PreviewCache:
+    """
+    PhotoImage previews keyed by image identity and preview size, least recently
+    used evicted first. Images are held weakly, so a cached preview never keeps a
+    replaced full-size array alive, and a recycled id() cannot return a stale preview.
+    """
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, np_img, maxsize=(700,700)):
+        key = (id(np_img), tuple(maxsize))
+        entry = self._entries.get(key)
+        if entry is not None and entry[0]() is np_img:
+            self._entries.move_to_end(key)
+            return entry[1]
+        tkimg = pil_from_np_gray(np_img, maxsize)
+        self._entries[key] = (weakref.ref(np_img), tkimg)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return tkimg
+
+    def clear(self):
+        self._entries.clear()
+
+_timed_canvas_class = None
+
+def timed_figure_canvas(fig, master):
+    # matplotlib is imported the first time a histogram is shown, not at startup.
+    global _timed_canvas_class
+    if _timed_canvas_class is None:
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        class TimedFigureCanvas(FigureCanvasTkAgg):
+            # Full redraws usually run from draw_idle after the action has returned.
+            def draw(self):
+                with instrument.stage("histogram redraw"):
+                    super().draw()
+        _timed_canvas_class = TimedFigureCanvas
+    return _timed_canvas_class(fig, master=master)
+
+class HistogramView:
+    """
+    Histogram panes that live for the whole session. update() swaps the line
+    data in place and blits just the axes; the figure is only fully redrawn
+    when the y or level range has to change (or on resize / toolbar navigation).
+    16-bit histograms are summed into the same number of display bins.
+    """
+    BINS = 256
+
+    def __init__(self, container, titles, figsize=(6,4)):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import NavigationToolbar2Tk
+        self.titles = tuple(titles)
+        self.fig = Figure(figsize=figsize, dpi=100)
+        self.axes = []
+        self.lines = []
+        self.levels = [self.BINS] * len(self.titles)
+        x = np.arange(self.BINS)
+        for i, title in enumerate(self.titles):
+            ax = self.fig.add_subplot(1, len(self.titles), i + 1)
+            line, = ax.plot(x, np.zeros(self.BINS), color='black', animated=True)
+            ax.set_title(title)
+            ax.set_xlim(0,255)
+            ax.set_ylim(0,1)
+            ax.set_xlabel("Intensity")
+            ax.set_ylabel("Frequency")
+            self.axes.append(ax)
+            self.lines.append(line)
+        self.backgrounds = None
+        self.canvas = timed_figure_canvas(self.fig, container)
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.toolbar = NavigationToolbar2Tk(self.canvas, container)
+        self.toolbar.update()
+        self.toolbar.pack(side=tk.TOP, fill=tk.X)
+
+    def on_draw(self, event=None):
+        # Lines are animated, so a full draw leaves them out: keep that as the
+        # background for blitting, then paint the lines on top.
+        self.backgrounds = [self.canvas.copy_from_bbox(ax.bbox) for ax in self.axes]
+        for ax, line in zip(self.axes, self.lines):
+            ax.draw_artist(line)
+
+    def update(self, hists):
+        redraw = self.backgrounds is None
+        for i, (ax, line, hist) in enumerate(zip(self.axes, self.lines, hists)):
+            levels = len(hist)
+            if levels != self.levels[i]:
+                self.levels[i] = levels
+                line.set_xdata(np.arange(self.BINS) * (levels / self.BINS))
+                ax.set_xlim(0, levels - 1)
+                redraw = True
+            hist = rebin_hist(hist, self.BINS)
+            line.set_ydata(hist)
+            top = max(float(np.max(hist)), 1.0) * 1.05
+            cur = ax.get_ylim()[1]
+            if top > cur or top < 0.5 * cur:
+                ax.set_ylim(0, top)
+                redraw = True
+        if redraw:
+            self.canvas.draw_idle()
+            return
+        with instrument.stage("histogram blit"):
+            for ax, line, bg in zip(self.axes, self.lines, self.backgrounds):
+                self.canvas.restore_region(bg)
+                ax.draw_artist(line)
+                self.canvas.blit(ax.bbox)
+
+    def destroy(self):
+        for widget in (self.toolbar, self.canvas.get_tk_widget()):
+            try: widget.destroy()
+            except: pass
+        self.fig.clear()
 
 class GrayscaleApp:
     def __init__(self, master):
@@ -138,17 +171,32 @@ class GrayscaleApp:
         self.nb.pack(fill=tk.BOTH, expand=True)
 
         
+        # GrayImage instances, so histograms travel with the pixels
         self.orig_img = None      
         self.current_img = None   
+        self.history = None
+        self.previews = PreviewCache()
         self.spec_src = None      
         self.spec_tgt = None      
         self.spec_result = None
+        # Adaptive equalization of the current image and the image it was computed from.
+        self.clahe_src = None
+        self.clahe_result = None
+        self.levels = 256
+        # Loads, edits and saves run as background jobs, in click order.
+        self.jobs = JobRunner(master)
 
         
         self.build_tab_stretch()
         self.build_tab_histeq()
+        self.build_tab_clahe()
         self.build_tab_spec()
 
+        master.bind_all("<Control-z>", lambda e: self.undo_single())
+        master.bind_all("<Control-y>", lambda e: self.redo_single())
+        JobBar(master, self.jobs).pack(side=tk.BOTTOM, fill=tk.X)
+        self.status = instrument.status_bar(master)
+
     #Stretch / Shrink / Piecewise / Slide
     def build_tab_stretch(self):
         tab = ttk.Frame(self.nb)
@@ -166,6 +214,8 @@ class GrayscaleApp:
         tk.Button(bframe, text="Load Image", command=self.load_image_single).pack(side=tk.LEFT, padx=4)
         tk.Button(bframe, text="Save Result", command=self.save_current_result).pack(side=tk.LEFT, padx=4)
         tk.Button(bframe, text="Reset", command=self.reset_single).pack(side=tk.LEFT, padx=4)
+        tk.Button(bframe, text="Undo", command=self.undo_single).pack(side=tk.LEFT, padx=4)
+        tk.Button(bframe, text="Redo", command=self.redo_single).pack(side=tk.LEFT, padx=4)
 
         # Linear Stretch
         lf = tk.LabelFrame(left, text="Linear Stretch (auto src range)", padx=6, pady=6)
@@ -192,10 +242,10 @@ class GrayscaleApp:
         # Piecewise
         pf = tk.LabelFrame(left, text="Piecewise Linear Mapping", padx=6, pady=6)
         pf.pack(fill=tk.X, pady=4)
-        tk.Label(pf, text="Threshold (0-255):").grid(row=0,column=0); self.pw_thresh = tk.Entry(pf,width=6); self.pw_thresh.insert(0,"128"); self.pw_thresh.grid(row=0,column=1)
-        tk.Label(pf, text="Low dst (a,b):").grid(row=0,column=2); self.pw_la = tk.Entry(pf,width=4); self.pw_lb = tk.Entry(pf,width=4)
+        self.pw_thresh_label = tk.Label(pf, text="Threshold (0-255):"); self.pw_thresh_label.grid(row=0,column=0); self.pw_thresh = tk.Entry(pf,width=6); self.pw_thresh.insert(0,"128"); self.pw_thresh.grid(row=0,column=1)
+        tk.Label(pf, text="Low dst (a,b):").grid(row=0,column=2); self.pw_la = tk.Entry(pf,width=6); self.pw_lb = tk.Entry(pf,width=6)
         self.pw_la.insert(0,"0"); self.pw_lb.insert(0,"127"); self.pw_la.grid(row=0,column=3); self.pw_lb.grid(row=0,column=4)
-        tk.Label(pf, text="High dst (c,d):").grid(row=1,column=2); self.pw_hc = tk.Entry(pf,width=4); self.pw_hd = tk.Entry(pf,width=4)
+        tk.Label(pf, text="High dst (c,d):").grid(row=1,column=2); self.pw_hc = tk.Entry(pf,width=6); self.pw_hd = tk.Entry(pf,width=6)
         self.pw_hc.insert(0,"128"); self.pw_hd.insert(0,"255"); self.pw_hc.grid(row=1,column=3); self.pw_hd.grid(row=1,column=4)
         tk.Button(pf, text="Apply Piecewise", command=self.apply_piecewise).grid(row=0,column=5,rowspan=2,padx=6)
 
@@ -205,6 +255,10 @@ class GrayscaleApp:
         tk.Label(hf, text="Low%:").grid(row=0,column=0); self.h_low = tk.Entry(hf,width=6); self.h_low.insert(0,"2"); self.h_low.grid(row=0,column=1)
         tk.Label(hf, text="High%:").grid(row=0,column=2); self.h_high = tk.Entry(hf,width=6); self.h_high.insert(0,"98"); self.h_high.grid(row=0,column=3)
         tk.Button(hf, text="Apply Percentile Stretch", command=self.apply_percentile_stretch).grid(row=0,column=4,padx=6)
+        # Level-valued entries and their 8-bit defaults, rescaled for 16-bit images.
+        self.level_entries = [(self.ls_dstmin, 0), (self.ls_dstmax, 255), (self.shr_dstmin, 50),
+                              (self.shr_dstmax, 200), (self.pw_thresh, 128), (self.pw_la, 0),
+                              (self.pw_lb, 127), (self.pw_hc, 128), (self.pw_hd, 255)]
 
     
         vb = tk.Frame(left)
@@ -222,8 +276,7 @@ class GrayscaleApp:
 
         self.hist_canvas_container_stretch = tk.Frame(preview_frame)
         self.hist_canvas_container_stretch.pack(fill=tk.BOTH, expand=True)
-        self.canvas_stretch = None
-        self.toolbar_stretch = None
+        self.hist_view_stretch = None
 
     #Histogram Equalization 
     def build_tab_histeq(self):
@@ -240,6 +293,8 @@ class GrayscaleApp:
         tk.Button(bframe, text="Apply Equalization", command=self.apply_histeq).pack(side=tk.LEFT, padx=4)
         tk.Button(bframe, text="Save Result", command=self.save_current_result).pack(side=tk.LEFT, padx=4)
         tk.Button(bframe, text="Reset", command=self.reset_single).pack(side=tk.LEFT, padx=4)
+        tk.Button(bframe, text="Undo", command=self.undo_single).pack(side=tk.LEFT, padx=4)
+        tk.Button(bframe, text="Redo", command=self.redo_single).pack(side=tk.LEFT, padx=4)
         tk.Button(bframe, text="Show Before/After Hist", command=self.show_before_after_hist_stretch).pack(side=tk.LEFT, padx=4)
 
         
@@ -252,8 +307,39 @@ class GrayscaleApp:
 
         self.hist_canvas_container_eq = tk.Frame(preview_frame)
         self.hist_canvas_container_eq.pack(fill=tk.BOTH, expand=True)
-        self.canvas_eq = None
-        self.toolbar_eq = None
+
+    # Adaptive (tile-based) Equalization
+    def build_tab_clahe(self):
+        tab = ttk.Frame(self.nb)
+        self.nb.add(tab, text="Adaptive Equalization (CLAHE)")
+
+        left = tk.Frame(tab)
+        left.pack(side=tk.LEFT, fill=tk.Y, padx=6, pady=6)
+        right = tk.Frame(tab)
+        right.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=6, pady=6)
+
+        bframe = tk.Frame(left); bframe.pack(fill=tk.X, pady=4)
+        tk.Button(bframe, text="Load Image", command=self.load_image_single).pack(side=tk.LEFT, padx=4)
+        tk.Button(bframe, text="Apply Adaptive Equalization", command=self.apply_clahe).pack(side=tk.LEFT, padx=4)
+        tk.Button(bframe, text="Save Result", command=self.save_clahe_result).pack(side=tk.LEFT, padx=4)
+
+        cf = tk.LabelFrame(left, text="Tile grid and clip limit", padx=6, pady=6)
+        cf.pack(fill=tk.X, pady=4)
+        tk.Label(cf, text="Tile rows:").grid(row=0,column=0); self.clahe_rows = tk.Entry(cf,width=6); self.clahe_rows.insert(0,"8"); self.clahe_rows.grid(row=0,column=1)
+        tk.Label(cf, text="Tile cols:").grid(row=0,column=2); self.clahe_cols = tk.Entry(cf,width=6); self.clahe_cols.insert(0,"8"); self.clahe_cols.grid(row=0,column=3)
+        tk.Label(cf, text="Clip limit (0 = none):").grid(row=1,column=0,columnspan=2,sticky="w"); self.clahe_clip = tk.Entry(cf,width=6); self.clahe_clip.insert(0,"2.0"); self.clahe_clip.grid(row=1,column=2)
+        tk.Label(left, text="Works on the current image of the other tabs,\nincluding any edits applied there.", justify=tk.LEFT).pack(anchor="w", pady=4)
+
+        preview_frame = tk.LabelFrame(right, text="Preview & Histogram", padx=6, pady=6)
+        preview_frame.pack(fill=tk.BOTH, expand=True)
+        self.clahe_before_label = tk.Label(preview_frame, text="Before")
+        self.clahe_before_label.pack(side=tk.LEFT, padx=6, pady=6)
+        self.clahe_after_label = tk.Label(preview_frame, text="After")
+        self.clahe_after_label.pack(side=tk.LEFT, padx=6, pady=6)
+
+        self.clahe_canvas_container = tk.Frame(preview_frame)
+        self.clahe_canvas_container.pack(fill=tk.BOTH, expand=True)
+        self.hist_view_clahe = None
 
     # Histogram Specification
     def build_tab_spec(self):
@@ -286,45 +372,109 @@ class GrayscaleApp:
 
         self.spec_canvas_container = tk.Frame(preview_frame)
         self.spec_canvas_container.pack(fill=tk.BOTH, expand=True)
-        self.canvas_spec = None
-        self.toolbar_spec = None
+        self.hist_view_spec = None
 
 
+    def read_gray(self, path):
+        # Job thread: decode and take the histogram once, off the Tk thread.
+        with instrument.stage("decode") as st:
+            img = load_gray(path)
+            st.record(img)
+        with instrument.stage("histogram"):
+            return GrayImage(img, ImageStats.from_image(img))
+
     def load_image_single(self):
         path = filedialog.askopenfilename(filetypes=[("Image files","*.png;*.jpg;*.jpeg;*.bmp;*.tif")])
         if not path: return
-        try:
-            img = load_gray(path)
-        except Exception as e:
-            messagebox.showerror("Load error", str(e))
-            return
-        self.orig_img = img
-        self.current_img = img.copy()
+        self.jobs.submit("Load image", self.read_gray, path, on_done=self.show_loaded_single,
+                         on_error=lambda e: messagebox.showerror("Load error", str(e)))
+
+    def set_levels(self, levels):
+        # Parameters are in the image's own levels: reset them to the defaults for its depth.
+        if levels == self.levels: return
+        self.levels = levels
+        for entry, default in self.level_entries:
+            entry.delete(0, tk.END)
+            entry.insert(0, str(round(default * (levels - 1) / 255)))
+        self.pw_thresh_label.configure(text=f"Threshold (0-{levels - 1}):")
+
+    def show_loaded_single(self, image):
+        self.set_levels(levels_for(image.data.dtype))
+        self.clahe_src = self.clahe_result = None
+        self.update_clahe_preview()
+        self.orig_img = image
+        self.history = EditHistory(self.orig_img)
+        self.current_img = self.orig_img
         self.display_single_before_after()
         self.clear_hist_canvas_stretch()
 
     def save_current_result(self):
-        img = self.current_img
-        if img is None:
+        if self.current_img is None:
             messagebox.showinfo("Save", "No image to save.")
             return
-        path = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG","*.png"),("JPG","*.jpg")])
+        path = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG","*.png"),("TIFF","*.tif"),("JPG","*.jpg")])
         if not path: return
-        cv2.imwrite(path, img)
-        messagebox.showinfo("Saved", f"Saved to {path}")
+        history = self.history
+
+        def write():
+            # Taken on the job thread, so edits queued before the save are included.
+            img = history.current()
+            with instrument.stage("encode"):
+                save_gray(path, img.data)
+        self.jobs.submit("Save result", write, on_done=lambda _: messagebox.showinfo("Saved", f"Saved to {path}"))
+
+    def submit_edit(self, name, prepare, show_hist=True):
+        # History edits run one after another on the job thread. prepare() does
+        # the slow part and returns (apply, img); apply() only updates the
+        # history and is skipped if the edit is cancelled first, so Cancel
+        # leaves the history as it was. The result is shown only if the same
+        # image is still loaded when it arrives.
+        history = self.history
+
+        def edit(commit):
+            apply, img = prepare()
+            commit(apply)
+            return img
+
+        def done(img):
+            if history is not self.history: return
+            self.current_img = img
+            self.display_single_before_after()
+            if show_hist:
+                self.show_before_after_hist_stretch()
+            else:
+                self.clear_hist_canvas_stretch()
+        self.jobs.submit(name, edit, on_done=done, with_commit=True)
+
+    def submit_move(self, name, target, show_hist=True):
+        # target(history) is read on the job thread, after any queued edits.
+        history = self.history
+
+        def prepare():
+            pos = target(history)
+            return (lambda: history.move_to(pos)), history.frame(pos)
+        self.submit_edit(name, prepare, show_hist)
 
     def reset_single(self):
         if self.orig_img is not None:
-            self.current_img = self.orig_img.copy()
-            self.display_single_before_after()
-            self.clear_hist_canvas_stretch()
+            self.submit_move("Reset", lambda history: 0, show_hist=False)
+
+    def undo_single(self):
+        # Undo/redo stay put at either end, so they can be queued behind edits.
+        if self.history is None: return
+        self.submit_move("Undo", EditHistory.undo_position)
+
+    def redo_single(self):
+        if self.history is None: return
+        self.submit_move("Redo", EditHistory.redo_position)
 
     def display_single_before_after(self):
         
         if self.orig_img is None:
             return
-        before_tk = pil_from_np_gray(self.orig_img)
-        after_tk = pil_from_np_gray(self.current_img)
+        # The original never changes, so only the "after" pane is normally re-rendered.
+        before_tk = self.previews.get(self.orig_img.data)
+        after_tk = self.previews.get(self.current_img.data)
         
         for lbl in (getattr(self,"preview_before_label",None), getattr(self,"preview_before_label_eq",None)):
             if lbl is not None:
@@ -343,10 +493,7 @@ class GrayscaleApp:
         except:
             messagebox.showerror("Input", "Invalid dst values.")
             return
-        res = linear_stretch(self.current_img, dst_min=dst_min, dst_max=dst_max)
-        self.current_img = res
-        self.display_single_before_after()
-        self.show_before_after_hist_stretch()
+        self.apply_chain_step("linear_stretch", dst_min=dst_min, dst_max=dst_max)
 
     def apply_shrink(self):
         if self.current_img is None: return
@@ -355,10 +502,7 @@ class GrayscaleApp:
         except:
             messagebox.showerror("Input","Invalid shrink values.")
             return
-        res = shrink_map(self.current_img, dst_min, dst_max)
-        self.current_img = res
-        self.display_single_before_after()
-        self.show_before_after_hist_stretch()
+        self.apply_chain_step("shrink", dst_min=dst_min, dst_max=dst_max)
 
     def apply_offset(self):
         if self.current_img is None: return
@@ -367,10 +511,7 @@ class GrayscaleApp:
         except:
             messagebox.showerror("Input","Invalid offset.")
             return
-        res = slide(self.current_img, off)
-        self.current_img = res
-        self.display_single_before_after()
-        self.show_before_after_hist_stretch()
+        self.apply_chain_step("slide", offset=off)
 
     def apply_piecewise(self):
         if self.current_img is None: return
@@ -381,10 +522,7 @@ class GrayscaleApp:
         except:
             messagebox.showerror("Input","Invalid piecewise params.")
             return
-        res = piecewise_linear(self.current_img, thresh, low_dst=(la,lb), high_dst=(hc,hd))
-        self.current_img = res
-        self.display_single_before_after()
-        self.show_before_after_hist_stretch()
+        self.apply_chain_step("piecewise", thresh=thresh, low_dst=(la,lb), high_dst=(hc,hd))
 
     def apply_percentile_stretch(self):
         if self.current_img is None: return
@@ -393,88 +531,71 @@ class GrayscaleApp:
         except:
             messagebox.showerror("Input","Invalid percentiles.")
             return
-        res = percentile_hist_stretch(self.current_img, low_pct=lowp, high_pct=highp, out_min=0, out_max=255)
-        self.current_img = res
-        self.display_single_before_after()
-        self.show_before_after_hist_stretch()
+        if not (0 <= lowp <= 100 and 0 <= highp <= 100):
+            messagebox.showerror("Input","Percentiles must be between 0 and 100.")
+            return
+        self.apply_chain_step("percentile", low_pct=lowp, high_pct=highp)
+
+    def apply_chain_step(self, name, **params):
+        # Every step is composed with the earlier ones into one LUT and
+        # applied to the original, so the image is only touched once.
+        history = self.history
+
+        def prepare():
+            with instrument.stage("kernel") as st:
+                step, img = history.prepare_push(name, **params)
+                st.record(img.data)
+            return (lambda: history.commit_push(step, img)), img
+        self.submit_edit(f"Apply {name}", prepare)
 
    
+    def show_hist_view(self, attr, container, titles, figsize, hists):
+        # Reuse the existing view when the pane layout is unchanged.
+        view = getattr(self, attr, None)
+        if view is not None and view.titles != tuple(titles):
+            view.destroy()
+            view = None
+        if view is None:
+            view = HistogramView(container, titles, figsize)
+            setattr(self, attr, view)
+        view.update(hists)
+
     def clear_hist_canvas_stretch(self):
-        if getattr(self,"canvas_stretch",None):
-            try:
-                self.canvas_stretch.get_tk_widget().destroy()
-            except: pass
-            self.canvas_stretch = None
-        if getattr(self,"toolbar_stretch",None):
-            try: self.toolbar_stretch.destroy()
-            except: pass
-            self.toolbar_stretch = None
-        if getattr(self,"canvas_eq",None):
-            try:
-                self.canvas_eq.get_tk_widget().destroy()
-            except: pass
-            self.canvas_eq = None
-        if getattr(self,"toolbar_eq",None):
-            try: self.toolbar_eq.destroy()
-            except: pass
-            self.toolbar_eq = None
+        if getattr(self,"hist_view_stretch",None):
+            self.hist_view_stretch.destroy()
+            self.hist_view_stretch = None
 
     def show_current_hist_single(self):
         if self.current_img is None: return
-        self.clear_hist_canvas_stretch()
-        fig = Figure(figsize=(6,4), dpi=100)
-        ax = fig.add_subplot(111)
-        plot_hist_on_axes(ax, self.current_img, title="Current Histogram")
-        canvas = FigureCanvasTkAgg(fig, master=self.hist_canvas_container_stretch)
-        canvas.draw()
-        self.canvas_stretch = canvas
-        self.canvas_stretch.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-        tb = NavigationToolbar2Tk(canvas, self.hist_canvas_container_stretch); tb.update(); tb.pack(side=tk.TOP, fill=tk.X)
-        self.toolbar_stretch = tb
+        self.show_hist_view("hist_view_stretch", self.hist_canvas_container_stretch,
+                            ("Current Histogram",), (6,4), [self.current_img.hist])
 
     def show_before_after_hist_stretch(self):
         if self.orig_img is None or self.current_img is None: return
-        self.clear_hist_canvas_stretch()
-        fig = Figure(figsize=(10,4), dpi=100)
-        ax1 = fig.add_subplot(121)
-        ax2 = fig.add_subplot(122)
-        plot_hist_on_axes(ax1, self.orig_img, title="Before Histogram")
-        plot_hist_on_axes(ax2, self.current_img, title="After Histogram")
-        canvas = FigureCanvasTkAgg(fig, master=self.hist_canvas_container_stretch)
-        canvas.draw()
-        self.canvas_stretch = canvas
-        self.canvas_stretch.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-        tb = NavigationToolbar2Tk(canvas, self.hist_canvas_container_stretch); tb.update(); tb.pack(side=tk.TOP, fill=tk.X)
-        self.toolbar_stretch = tb
+        self.show_hist_view("hist_view_stretch", self.hist_canvas_container_stretch,
+                            ("Before Histogram", "After Histogram"), (10,4),
+                            [self.orig_img.hist, self.current_img.hist])
 
     
     def apply_histeq(self):
         if self.current_img is None: return
-        res = histogram_equalize(self.current_img)
-        self.current_img = res
-        self.display_single_before_after()
-        self.show_before_after_hist_stretch()
+        self.apply_chain_step("equalize")
 
    
     def load_spec_source(self):
         path = filedialog.askopenfilename(filetypes=[("Image files","*.png;*.jpg;*.jpeg;*.bmp;*.tif")])
         if not path: return
-        try:
-            img = load_gray(path)
-        except Exception as e:
-            messagebox.showerror("Load", str(e)); return
-        self.spec_src = img
-        self.spec_result = None
-        self.update_spec_preview()
+        self.jobs.submit("Load spec source", self.read_gray, path, on_done=lambda img: self.set_spec_image("spec_src", img),
+                         on_error=lambda e: messagebox.showerror("Load", str(e)))
 
     def load_spec_target(self):
         path = filedialog.askopenfilename(filetypes=[("Image files","*.png;*.jpg;*.jpeg;*.bmp;*.tif")])
         if not path: return
-        try:
-            img = load_gray(path)
-        except Exception as e:
-            messagebox.showerror("Load", str(e)); return
-        self.spec_tgt = img
+        self.jobs.submit("Load spec target", self.read_gray, path, on_done=lambda img: self.set_spec_image("spec_tgt", img),
+                         on_error=lambda e: messagebox.showerror("Load", str(e)))
+
+    def set_spec_image(self, attr, img):
+        setattr(self, attr, img)
         self.spec_result = None
         self.update_spec_preview()
 
@@ -482,12 +603,71 @@ class GrayscaleApp:
         if self.spec_src is None or self.spec_tgt is None:
             messagebox.showinfo("Spec", "Load both Source and Target images first.")
             return
-        mapping = histogram_specification_map(self.spec_src, self.spec_tgt)  # steps 1..3 slides
-        result = apply_mapping(self.spec_src, mapping)  # step 5 slides
-        self.spec_result = result
-        self.update_spec_preview()
-        
-        self.show_spec_histograms()
+        src, tgt = self.spec_src, self.spec_tgt
+
+        def match():
+            with instrument.stage("kernel") as st:
+                mapping = specification_lut(src.stats, tgt.stats.cdf)  # steps 1..3 slides
+                result = src.map(mapping)  # step 5 slides
+                st.record(result.data)
+            return result
+
+        def done(result):
+            if src is not self.spec_src or tgt is not self.spec_tgt: return
+            self.spec_result = result
+            self.update_spec_preview()
+            
+            self.show_spec_histograms()
+        self.jobs.submit("Apply specification", match, on_done=done)
+
+    def apply_clahe(self):
+        if self.current_img is None: return
+        try:
+            tiles = (int(self.clahe_rows.get()), int(self.clahe_cols.get()))
+            clip = float(self.clahe_clip.get())
+        except:
+            messagebox.showerror("Input","Invalid tile grid or clip limit.")
+            return
+        src = self.current_img
+
+        def equalize():
+            with instrument.stage("kernel") as st:
+                data = adaptive_equalize(src.data, tiles, clip)
+                st.record(data)
+            with instrument.stage("histogram"):
+                return GrayImage(data, ImageStats.from_image(data))
+
+        def done(result):
+            if src is not self.current_img: return
+            self.clahe_src, self.clahe_result = src, result
+            self.update_clahe_preview()
+            self.show_hist_view("hist_view_clahe", self.clahe_canvas_container,
+                                ("Before Histogram", "After Histogram"), (10,4), [src.hist, result.hist])
+        self.jobs.submit("Apply adaptive equalization", equalize, on_done=done,
+                         on_error=lambda e: messagebox.showerror("Adaptive equalization", str(e)))
+
+    def update_clahe_preview(self):
+        for label, img in ((self.clahe_before_label, self.clahe_src), (self.clahe_after_label, self.clahe_result)):
+            if img is None:
+                label.configure(image="")
+                label.image = None
+            else:
+                tkimg = self.previews.get(img.data)
+                label.configure(image=tkimg)
+                label.image = tkimg
+
+    def save_clahe_result(self):
+        if self.clahe_result is None:
+            messagebox.showinfo("Save", "No result to save.")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG","*.png"),("TIFF","*.tif")])
+        if not path: return
+        data = self.clahe_result.data
+
+        def write():
+            with instrument.stage("encode"):
+                save_gray(path, data)
+        self.jobs.submit("Save adaptive result", write, on_done=lambda _: messagebox.showinfo("Saved", f"Saved {path}"))
 
     def update_spec_preview(self):
         
@@ -498,7 +678,7 @@ class GrayscaleApp:
                 label.configure(image="", text=label.cget("text"))
                 label.image = None
             else:
-                tkimg = pil_from_np_gray(img)
+                tkimg = self.previews.get(img.data)
                 label.configure(image=tkimg, text="")
                 label.image = tkimg
 
@@ -507,25 +687,9 @@ class GrayscaleApp:
         if self.spec_src is None or self.spec_tgt is None or self.spec_result is None:
             return
         
-        if getattr(self,"canvas_spec",None):
-            try: self.canvas_spec.get_tk_widget().destroy()
-            except: pass
-            self.canvas_spec = None
-        if getattr(self,"toolbar_spec",None):
-            try: self.toolbar_spec.destroy()
-            except: pass
-            self.toolbar_spec = None
-        fig = Figure(figsize=(12,4), dpi=100)
-        a1 = fig.add_subplot(131); a2 = fig.add_subplot(132); a3 = fig.add_subplot(133)
-        plot_hist_on_axes(a1, self.spec_src, title="Source Histogram")
-        plot_hist_on_axes(a2, self.spec_tgt, title="Target Histogram")
-        plot_hist_on_axes(a3, self.spec_result, title="Result Histogram")
-        canvas = FigureCanvasTkAgg(fig, master=self.spec_canvas_container)
-        canvas.draw()
-        self.canvas_spec = canvas
-        self.canvas_spec.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-        tb = NavigationToolbar2Tk(canvas, self.spec_canvas_container); tb.update(); tb.pack(side=tk.TOP, fill=tk.X)
-        self.toolbar_spec = tb
+        self.show_hist_view("hist_view_spec", self.spec_canvas_container,
+                            ("Source Histogram", "Target Histogram", "Result Histogram"), (12,4),
+                            [self.spec_src.hist, self.spec_tgt.hist, self.spec_result.hist])
 
     def save_spec_result(self):
         if self.spec_result is None:
@@ -533,20 +697,19 @@ class GrayscaleApp:
             return
         path = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG","*.png")])
         if not path: return
-        cv2.imwrite(path, self.spec_result)
-        messagebox.showinfo("Saved", f"Saved {path}")
+        data = self.spec_result.data
+
+        def write():
+            with instrument.stage("encode"):
+                save_gray(path, data)
+        self.jobs.submit("Save spec result", write, on_done=lambda _: messagebox.showinfo("Saved", f"Saved {path}"))
 
     def reset_spec_tab(self):
         self.spec_src = None; self.spec_tgt = None; self.spec_result = None
         self.update_spec_preview()
-        if getattr(self,"canvas_spec",None):
-            try: self.canvas_spec.get_tk_widget().destroy()
-            except: pass
-            self.canvas_spec = None
-        if getattr(self,"toolbar_spec",None):
-            try: self.toolbar_spec.destroy()
-            except: pass
-            self.toolbar_spec = None
+        if getattr(self,"hist_view_spec",None):
+            self.hist_view_spec.destroy()
+            self.hist_view_spec = None
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -1,32 +1,27 @@
+import queue
+import threading
 import tkinter as tk
 from tkinter import filedialog
 from PIL import Image, ImageTk
 import numpy as np
-import cv2
 
+import instrument
+from jobs import JobRunner, JobBar
+# The kernels live in imagecore.ace; they are re-exported here for existing callers.
+from imagecore.ace import (
+    TILE_ROWS, MAX_INT_WINDOW, global_mean, local_mean_std, ace_from_local_stats,
+    adaptive_contrast_enhancement, adaptive_contrast_enhancement_tiled, LocalStatsCache, ace_sweep)
 
-def adaptive_contrast_enhancement(image_np, k1=0.5, k2=0.5, window_size=11):
-    """
-    Implements ACE:
-    E(r,c) = k1 * [m_I / σ_l(r,c)] * [I(r,c) - m_l(r,c) + k2 * m_l(r,c)]
-    """
-    I = image_np.astype(np.float32) / 255.0
-    m_I = np.mean(I)
-
-    kernel = np.ones((window_size, window_size), np.float32) / (window_size**2)
-    m_l = cv2.filter2D(I, -1, kernel)
-    local_sq_mean = cv2.filter2D(I**2, -1, kernel)
-    sigma_l = np.sqrt(np.maximum(local_sq_mean - m_l**2, 1e-6))
-
-    
-    E = k1 * (m_I / sigma_l) * (I - m_l + k2 * m_l)
-
-    
-    E = np.clip(E, 0, 1)
-    return (E * 255).astype(np.uint8)
 
 
 class ACE_GUI:
+    PREVIEW_SIZE = 500
+    DEBOUNCE_MS = 80
+    POLL_MS = 30
+    # Above this many pixels the full render runs strip by strip, with progress
+    # and cancellation, instead of caching whole-image local statistics.
+    TILED_PIXELS = 16000000
+
     def __init__(self, root):
         self.root = root
         self.root.title("Adaptive Contrast Enhancement (ACE)")
@@ -34,10 +29,25 @@ class ACE_GUI:
         self.root.configure(bg="#f0f0f0")
 
         self.image = None
+        self.stats_cache = None
         self.result = None
+        self.result_params = None
         self.original_photo = None
         self.result_photo = None
 
+        # Live preview: slider moves are debounced on the Tk thread, computed on a
+        # downscaled copy in a worker thread, and handed back through a queue that
+        # is polled with after(). Only the newest request is ever computed.
+        self.preview_image = None
+        self.preview_scale = 1.0
+        self.preview_generation = 0
+        self.debounce_id = None
+        self.polling = False
+        self.preview_jobs = queue.Queue()
+        self.preview_results = queue.Queue()
+        threading.Thread(target=self.preview_worker, daemon=True).start()
+        # Loading, full renders and saving run as background jobs, in click order.
+        self.jobs = JobRunner(self.root)
         
         self.k1_var = tk.DoubleVar(value=0.5)
         self.k2_var = tk.DoubleVar(value=0.5)
@@ -45,6 +55,7 @@ class ACE_GUI:
 
         
         self.build_ui()
+        self.status = instrument.status_bar(self.root)
 
     def build_ui(self):
         
@@ -53,15 +64,15 @@ class ACE_GUI:
 
         tk.Label(param_frame, text="k1 (Local Gain):", bg="#f0f0f0").grid(row=0, column=0, sticky="w")
         tk.Scale(param_frame, from_=0, to=1.0, resolution=0.01, orient=tk.HORIZONTAL, length=200,
-                 variable=self.k1_var).grid(row=0, column=1)
+                 variable=self.k1_var, command=self.schedule_preview).grid(row=0, column=1)
 
         tk.Label(param_frame, text="k2 (Local Mean Factor):", bg="#f0f0f0").grid(row=1, column=0, sticky="w")
         tk.Scale(param_frame, from_=0, to=1.0, resolution=0.01, orient=tk.HORIZONTAL, length=200,
-                 variable=self.k2_var).grid(row=1, column=1)
+                 variable=self.k2_var, command=self.schedule_preview).grid(row=1, column=1)
 
         tk.Label(param_frame, text="Window Size (odd):", bg="#f0f0f0").grid(row=2, column=0, sticky="w")
-        tk.Scale(param_frame, from_=1, to=21, resolution=2, orient=tk.HORIZONTAL, length=200,
-                 variable=self.window_var).grid(row=2, column=1)
+        tk.Scale(param_frame, from_=1, to=101, resolution=2, orient=tk.HORIZONTAL, length=200,
+                 variable=self.window_var, command=self.schedule_preview).grid(row=2, column=1)
 
         
         btn_frame = tk.Frame(self.root, bg="#f0f0f0")
@@ -70,6 +81,7 @@ class ACE_GUI:
         tk.Button(btn_frame, text="Load Image", command=self.load_image, width=15, bg="#4CAF50", fg="white").pack(side=tk.LEFT, padx=10)
         tk.Button(btn_frame, text="Apply ACE", command=self.apply_ace, width=15, bg="#2196F3", fg="white").pack(side=tk.LEFT, padx=10)
         tk.Button(btn_frame, text="Save Result", command=self.save_result, width=15, bg="#FF9800", fg="white").pack(side=tk.LEFT, padx=10)
+        JobBar(self.root, self.jobs, bg="#f0f0f0").pack(pady=2)
 
         
         img_frame = tk.Frame(self.root, bg="#f0f0f0")
@@ -86,19 +98,50 @@ class ACE_GUI:
     def load_image(self):
         path = filedialog.askopenfilename(filetypes=[("Images", "*.jpg;*.jpeg;*.png;*.bmp")])
         if path:
+            self.jobs.submit("Load image", self.read_image, path, on_done=self.show_loaded)
+
+    def read_image(self, path):
+        # Runs on the job thread; the widgets are only touched in show_loaded.
+        with instrument.stage("decode") as st:
             img = Image.open(path).convert('L')
-            self.image = np.array(img)
-            self.display_image(img, self.original_label, is_result=False)
+            image = np.array(img)
+            st.record(image)
+        # Full-resolution statistics for one window only (two float32 planes);
+        # moving k1/k2 reuses them, a new window size replaces them.
+        stats_cache = LocalStatsCache(image, max_windows=1)
 
-    def display_image(self, img_pil, label, is_result):
-        
+        w, h = img.size
+        preview_scale = min(1.0, self.PREVIEW_SIZE / max(w, h))
+        if preview_scale < 1.0:
+            with instrument.stage("preview resize"):
+                img = img.resize((max(1, int(w * preview_scale)), max(1, int(h * preview_scale))),
+                                 Image.Resampling.LANCZOS)
+        return image, stats_cache, img, preview_scale
+
+    def show_loaded(self, loaded):
+        self.image, self.stats_cache, img, self.preview_scale = loaded
+        self.result = None
+        self.result_params = None
+        self.preview_image = np.array(img)
+        self.preview_generation += 1
+        self.display_image(img, self.original_label, is_result=False)
+        self.schedule_preview()
+
+    def fit_display(self, img_pil):
         w, h = img_pil.size
         max_size = 500
         if w > max_size or h > max_size:
             scale = min(max_size / w, max_size / h)
-            img_pil = img_pil.resize((int(w * scale), int(h * scale)), Image.Resampling.LANCZOS)
+            with instrument.stage("display resize"):
+                img_pil = img_pil.resize((int(w * scale), int(h * scale)), Image.Resampling.LANCZOS)
+        return img_pil
 
-        photo = ImageTk.PhotoImage(img_pil)
+    def display_image(self, img_pil, label, is_result):
+        
+        img_pil = self.fit_display(img_pil)
+
+        with instrument.stage("PhotoImage"):
+            photo = ImageTk.PhotoImage(img_pil)
         label.config(image=photo)
         label.image = photo  
 
@@ -107,29 +150,127 @@ class ACE_GUI:
         else:
             self.original_photo = photo
 
-    def apply_ace(self):
-        if self.image is None:
-            return
-
+    def current_params(self):
         k1 = self.k1_var.get()
         k2 = self.k2_var.get()
         window_size = self.window_var.get()
         if window_size % 2 == 0:
             window_size += 1  
+        return k1, k2, window_size
+
+    def schedule_preview(self, _value=None):
+        if self.preview_image is None:
+            return
+        if self.debounce_id is not None:
+            self.root.after_cancel(self.debounce_id)
+        self.debounce_id = self.root.after(self.DEBOUNCE_MS, self.submit_preview)
 
-        enhanced = adaptive_contrast_enhancement(self.image, k1, k2, window_size)
-        self.result = enhanced
-        result_pil = Image.fromarray(enhanced)
-        self.display_image(result_pil, self.result_label, is_result=True)
+    def submit_preview(self):
+        self.debounce_id = None
+        self.preview_generation += 1
+        k1, k2, window_size = self.current_params()
+        # Shrink the window with the image so the preview looks like the full render.
+        preview_window = max(1, int(round(window_size * self.preview_scale))) | 1
+        self.preview_jobs.put((self.preview_generation, self.preview_image, k1, k2, preview_window))
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.POLL_MS, self.poll_preview)
+
+    def preview_worker(self):
+        cache = None
+        while True:
+            job = self.preview_jobs.get()
+            # Skip anything superseded while we were busy.
+            while not self.preview_jobs.empty():
+                job = self.preview_jobs.get()
+            generation, image, k1, k2, window_size = job
+            if cache is None or cache.image is not image:
+                cache = LocalStatsCache(image)
+            try:
+                with instrument.action("ACE preview"), instrument.stage("kernel") as st:
+                    result = cache.enhance(k1, k2, window_size)
+                    st.record(result)
+            except Exception:
+                result = None
+            self.preview_results.put((generation, result))
+
+    def poll_preview(self):
+        latest = None
+        while not self.preview_results.empty():
+            latest = self.preview_results.get()
+        if latest is not None and latest[0] == self.preview_generation:
+            if latest[1] is not None:
+                self.display_image(Image.fromarray(latest[1]), self.result_label, is_result=True)
+            self.polling = False
+            return
+        self.root.after(self.POLL_MS, self.poll_preview)
+
+    def render_full(self, image, stats_cache, params, progress=None):
+        # Job thread. The image and cache are the ones current when the job was
+        # queued, so a load queued in between cannot swap them mid-render.
+        with instrument.stage("kernel") as st:
+            if image.size > self.TILED_PIXELS:
+                result = adaptive_contrast_enhancement_tiled(image, *params, progress=progress)
+            else:
+                # Moving only k1/k2 reuses the cached local statistics for this window.
+                result = stats_cache.enhance(*params)
+            st.record(result)
+        return result
+
+    def cached_result(self, params):
+        if self.result is not None and self.result_params == params:
+            return self.result
+        return None
+
+    def store_result(self, image, params, result):
+        if image is self.image:
+            self.result = result
+            self.result_params = params
+
+    def apply_ace(self):
+        if self.image is None:
+            return
+        params = self.current_params()
+        image = self.image
+
+        stats_cache = self.stats_cache
+
+        def render(progress):
+            # The display-size copy is made here too, off the Tk thread.
+            enhanced = self.render_full(image, stats_cache, params, progress)
+            return enhanced, self.fit_display(Image.fromarray(enhanced))
+
+        def show(rendered):
+            enhanced, shown = rendered
+            self.store_result(image, params, enhanced)
+            if image is self.image:
+                self.display_image(shown, self.result_label, is_result=True)
+
+        enhanced = self.cached_result(params)
+        if enhanced is not None:
+            show((enhanced, Image.fromarray(enhanced)))
+            return
+        self.jobs.submit("Apply ACE", render, with_progress=True, on_done=show)
 
     def save_result(self):
-        if self.result is None:
+        if self.image is None:
             return
         path = filedialog.asksaveasfilename(defaultextension=".png",
                                             filetypes=[("PNG Image", "*.png"), ("JPEG", "*.jpg")])
-        if path:
-            Image.fromarray(self.result).save(path)
+        if not path:
+            return
+        params = self.current_params()
+        image, stats_cache = self.image, self.stats_cache
+        enhanced = self.cached_result(params)
+
+        def render_and_save(progress):
+            result = enhanced if enhanced is not None else self.render_full(image, stats_cache, params, progress)
+            with instrument.stage("encode"):
+                Image.fromarray(result).save(path)
+            return result
 
+        self.jobs.submit("Save result", render_and_save, with_progress=True,
+                         on_done=lambda result: self.store_result(image, params, result))
 
 if __name__ == "__main__":
     root = tk.Tk()
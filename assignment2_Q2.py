@@ -1,42 +1,17 @@
 import tkinter as tk
 from tkinter import filedialog
 from PIL import Image, ImageTk
-import cv2
 import numpy as np
 
-def histogram_equalization(channel):
+import instrument
+from jobs import JobRunner, JobBar
+# The kernels live in imagecore.color; they are re-exported here for existing callers.
+from imagecore.color import (
+    IDENTITY_LUT, HIST_BAND_PIXELS, channel_hist, equalization_lut, stretch_lut,
+    range_stretch_lut, histogram_equalization, histogram_stretch, hls_contrast_lut,
+    color_contrast_enhancement)
+from imagecore.gray import hist_min_max as hist_range
 
-    hist, bins = np.histogram(channel.flatten(), 256, [0, 256])
-    cdf = hist.cumsum()
-    cdf_normalized = cdf * 255 / cdf[-1]  
-    equalized = np.interp(channel.flatten(), bins[:-1], cdf_normalized)
-    return equalized.reshape(channel.shape).astype(np.uint8)
-
-def histogram_stretch(channel):
-    min_val = np.min(channel)
-    max_val = np.max(channel)
-    if max_val == min_val:
-        return channel.copy()
-    stretched = (channel - min_val) * (255.0 / (max_val - min_val))
-    return np.clip(stretched, 0, 255).astype(np.uint8)
-
-
-def color_contrast_enhancement(image_np):
-    hls = cv2.cvtColor(image_np, cv2.COLOR_RGB2HLS)
-    h, l, s = cv2.split(hls)
-
-    # Enhance S (Histogram Equalization)
-    s_eq = histogram_equalization(s)
-
-    # Enhance L (Histogram Stretching)
-    l_stretched = histogram_stretch(l)
-
-    # Merge channels back
-    hls_enhanced = cv2.merge([h, l_stretched, s_eq])
-
-    
-    enhanced_rgb = cv2.cvtColor(hls_enhanced, cv2.COLOR_HLS2RGB)
-    return enhanced_rgb
 
 class ColorContrastApp:
     def __init__(self, master):
@@ -47,6 +22,8 @@ class ColorContrastApp:
         self.enhanced_image = None
         self.original_photo = None
         self.enhanced_photo = None
+        # Loading and enhancement run as background jobs, in click order.
+        self.jobs = JobRunner(master)
 
         
         button_frame = tk.Frame(master)
@@ -57,6 +34,7 @@ class ColorContrastApp:
 
         self.enhance_button = tk.Button(button_frame, text="Enhance Image", command=self.enhance_image, state=tk.DISABLED)
         self.enhance_button.pack(side=tk.LEFT, padx=10)
+        JobBar(master, self.jobs).pack(pady=2)
 
         
         self.image_frame = tk.Frame(master)
@@ -71,6 +49,8 @@ class ColorContrastApp:
         self.enhanced_label = tk.Label(self.image_frame, text="No Image", bg="gray")
         self.enhanced_label.grid(row=1, column=1, padx=10, pady=5)
 
+        self.status = instrument.status_bar(master)
+
 
 
     def load_image(self):
@@ -78,42 +58,57 @@ class ColorContrastApp:
         if not path:
             return
 
-        try:
+        self.jobs.submit("Load image", self.read_image, path, on_done=self.show_loaded,
+                         on_error=lambda e: self.original_label.config(text=f"Error loading image: {e}"))
+
+    def read_image(self, path):
+        # Job thread: decode and shrink for display; widgets are updated in show_loaded.
+        with instrument.stage("decode") as st:
             img = Image.open(path).convert("RGB")
-            self.original_image = np.array(img)
-            display_img = self.resize_image_for_display(img)
+            image = np.array(img)
+            st.record(image)
+        return image, self.resize_image_for_display(img)
+
+    def show_loaded(self, loaded):
+        self.original_image, display_img = loaded
+        with instrument.stage("PhotoImage"):
             self.original_photo = ImageTk.PhotoImage(display_img)
-            self.original_label.config(image=self.original_photo, text="")
-            self.original_label.image = self.original_photo
-            self.enhanced_label.config(image='', text="Ready to Enhance")
-            self.enhance_button.config(state=tk.NORMAL)
-        except Exception as e:
-            self.original_label.config(text=f"Error loading image: {e}")
+        self.original_label.config(image=self.original_photo, text="")
+        self.original_label.image = self.original_photo
+        self.enhanced_label.config(image='', text="Ready to Enhance")
+        self.enhance_button.config(state=tk.NORMAL)
 
     def resize_image_for_display(self, img, max_width=500, max_height=500):
     
         w, h = img.size
         ratio = min(max_width / w, max_height / h)
         new_size = (int(w * ratio), int(h * ratio))
-        return img.resize(new_size, Image.Resampling.LANCZOS)
+        with instrument.stage("display resize"):
+            return img.resize(new_size, Image.Resampling.LANCZOS)
 
 
     def enhance_image(self):
         if self.original_image is None:
             return
 
-        try:
-            enhanced = color_contrast_enhancement(self.original_image)
-            self.enhanced_image = enhanced
-
-            enhanced_pil = Image.fromarray(enhanced)
-            display_img = self.resize_image_for_display(enhanced_pil)
+        self.jobs.submit("Enhance image", self.enhance, self.original_image, on_done=self.show_enhanced,
+                         on_error=lambda e: self.enhanced_label.config(text=f"Processing Error: {e}"))
+
+    def enhance(self, image):
+        with instrument.stage("kernel") as st:
+            enhanced = color_contrast_enhancement(image)
+            st.record(enhanced)
+        return image, enhanced, self.resize_image_for_display(Image.fromarray(enhanced))
+
+    def show_enhanced(self, result):
+        source, enhanced, display_img = result
+        if source is not self.original_image:
+            return  # another image was loaded meanwhile
+        self.enhanced_image = enhanced
+        with instrument.stage("PhotoImage"):
             self.enhanced_photo = ImageTk.PhotoImage(display_img)
-            self.enhanced_label.config(image=self.enhanced_photo, text="")
-            self.enhanced_label.image = self.enhanced_photo
-
-        except Exception as e:
-            self.enhanced_label.config(text=f"Processing Error: {e}")
+        self.enhanced_label.config(image=self.enhanced_photo, text="")
+        self.enhanced_label.image = self.enhanced_photo
 
 if __name__ == "__main__":
     root = tk.Tk()
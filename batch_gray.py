@@ -0,0 +1,234 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from imagecore import lut
+from imagecore.gray import load_gray, target_cdf, PointChain, holds_16bit, levels_for
+
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+def _percent(value):
+    pct = float(value)
+    if not 0 <= pct <= 100:
+        raise ValueError(f"percentile {value} is outside [0, 100]")
+    return pct
+
+
+# name -> (number of numeric args, callable(*args) -> PointChain step params)
+OPERATIONS = {
+    "linear_stretch": (2, lambda a, b: dict(dst_min=int(a), dst_max=int(b))),
+    "shrink": (2, lambda a, b: dict(dst_min=int(a), dst_max=int(b))),
+    "slide": (1, lambda off: dict(offset=int(off))),
+    "piecewise": (5, lambda t, la, lb, hc, hd: dict(
+        thresh=int(t), low_dst=(int(la), int(lb)), high_dst=(int(hc), int(hd)))),
+    "percentile": (2, lambda lo, hi: dict(low_pct=_percent(lo), high_pct=_percent(hi))),
+    "equalize": (0, lambda: {}),
+}
+
+_worker_chain = None
+
+
+def parse_op(spec):
+    """Parse ``name[:a,b,...]`` into ``(name, args)``; ``spec:PATH`` names a reference image."""
+    name, _, rest = spec.partition(":")
+    name = name.strip()
+    if name == "spec":
+        if not rest:
+            raise ValueError("spec needs a reference image: spec:PATH")
+        return name, (rest,)
+    if name not in OPERATIONS:
+        raise ValueError(f"Unknown operation '{name}'. Choose from: "
+                         + ", ".join(sorted(OPERATIONS) + ["spec"]))
+    args = tuple(a.strip() for a in rest.split(",")) if rest else ()
+    nargs = OPERATIONS[name][0]
+    if len(args) != nargs:
+        raise ValueError(f"{name} expects {nargs} argument(s), got {len(args)}")
+    # Run the builder here, so e.g. slide:2.5 is a usage error rather than a failed worker.
+    try:
+        OPERATIONS[name][1](*args)
+    except ValueError as e:
+        raise ValueError(f"Invalid {name} arguments '{rest}': {e}")
+    return name, args
+
+
+def collect_inputs(inputs):
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for entry in sorted(os.listdir(item)):
+                if entry.lower().endswith(IMAGE_EXTS):
+                    files.append(os.path.join(item, entry))
+        else:
+            files.extend(sorted(glob.glob(item)))
+    # A file matched by two inputs (a directory and a glob, say) is processed once.
+    seen = set()
+    unique = []
+    for f in files:
+        key = path_key(f)
+        if key not in seen:
+            seen.add(key)
+            unique.append(f)
+    return unique
+
+
+def build_chain(ops):
+    # The whole --op sequence compiles to one LUT per image.
+    chain = PointChain()
+    for name, args in ops:
+        if name == "spec":
+            chain.append("spec", cdf_tgt=target_cdf(load_gray(args[0])))
+        else:
+            chain.append(name, **OPERATIONS[name][1](*args))
+    return chain
+
+
+def _init_worker(ops):
+    global _worker_chain
+    _worker_chain = build_chain(ops)
+    # One process per core already; keep OpenCV and the LUT bands from oversubscribing.
+    cv2.setNumThreads(1)
+    lut.set_num_threads(1)
+
+
+def process_file(src, dst):
+    t0 = time.perf_counter()
+    img = load_gray(src)
+    t1 = time.perf_counter()
+    res = _worker_chain.apply(img)
+    t2 = time.perf_counter()
+    if not cv2.imwrite(dst, res):
+        raise IOError(f"Could not write {dst}")
+    t3 = time.perf_counter()
+    return img.size, t1 - t0, t2 - t1, t3 - t2
+
+
+def output_path(src, out_dir, suffix):
+    base, ext = os.path.splitext(os.path.basename(src))
+    return os.path.join(out_dir, f"{base}{suffix}{ext}")
+
+
+def path_key(path):
+    """Key that is equal for two paths naming the same file (symlinks, case on Windows)."""
+    return os.path.normcase(os.path.realpath(path))
+
+
+def plan_outputs(files, out_dir, suffix="", in_place=False):
+    """
+    (src, dst) for every file. Raises ValueError, before anything is written,
+    if two inputs would be written to the same path, if a result would replace
+    another input, or if it would replace its own input and in_place is False.
+    """
+    inputs = {path_key(f) for f in files}
+    targets = {}
+    pairs = []
+    for src in files:
+        dst = output_path(src, out_dir, suffix)
+        key = path_key(dst)
+        if key in targets:
+            raise ValueError(f"{targets[key]} and {src} would both be written to {dst}; "
+                             "use separate runs or --suffix")
+        if key == path_key(src):
+            if not in_place:
+                raise ValueError(f"{dst} would overwrite its input; choose another --out-dir, "
+                                 "a --suffix, or pass --in-place")
+        elif key in inputs:
+            raise ValueError(f"the result of {src} would overwrite another input, {dst}")
+        targets[key] = src
+        pairs.append((src, dst))
+    return pairs
+
+
+def check_output_depth(pairs, levels):
+    """
+    Raise ValueError if results with `levels` grey levels would go to a format
+    that holds only 8 bits (JPEG, BMP), where cv2.imwrite saturates them.
+    """
+    if levels <= 256:
+        return
+    for src, dst in pairs:
+        if not holds_16bit(dst):
+            raise ValueError(f"{src} would be matched to a 16-bit reference, which "
+                             f"{os.path.splitext(dst)[1]} output cannot hold; convert the inputs "
+                             "to PNG or TIFF, or use an 8-bit reference")
+
+
+def spec_levels(ops):
+    """Levels of the last spec: reference, which sets the result depth (None without spec)."""
+    refs = [args[0] for name, args in ops if name == "spec"]
+    if not refs:
+        return None
+    try:
+        return levels_for(load_gray(refs[-1]).dtype)
+    except IOError:
+        raise ValueError(f"Could not read reference image {refs[-1]}")
+
+
+def run_batch(files, ops, out_dir, workers=None, suffix="", log=print, in_place=False):
+    pairs = plan_outputs(files, out_dir, suffix, in_place)
+    # Without spec: every result keeps its source depth, which its own format holds.
+    check_output_depth(pairs, spec_levels(ops) or 256)
+    os.makedirs(out_dir, exist_ok=True)
+    total_px = 0
+    failures = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(ops,)) as pool:
+        futures = {pool.submit(process_file, src, dst): src for src, dst in pairs}
+        for fut in as_completed(futures):
+            src = futures[fut]
+            try:
+                npx, t_dec, t_op, t_enc = fut.result()
+            except Exception as e:
+                failures += 1
+                log(f"FAILED {src}: {e}")
+                continue
+            total_px += npx
+            elapsed = t_dec + t_op + t_enc
+            log(f"{src}: {npx / 1e6:.2f} MP  decode {t_dec * 1e3:.1f} ms  "
+                f"ops {t_op * 1e3:.1f} ms  encode {t_enc * 1e3:.1f} ms  "
+                f"{npx / 1e6 / max(elapsed, 1e-9):.1f} MP/s")
+    wall = time.perf_counter() - start
+    done = len(files) - failures
+    log(f"Processed {done}/{len(files)} files, {total_px / 1e6:.1f} MP in {wall:.2f} s "
+        f"({total_px / 1e6 / max(wall, 1e-9):.1f} MP/s aggregate)")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Apply ass1.py grayscale point operations to many images.")
+    parser.add_argument("inputs", nargs="+", help="Image files, directories or glob patterns")
+    parser.add_argument("-o", "--out-dir", required=True, help="Directory for results")
+    parser.add_argument("--op", action="append", required=True, metavar="NAME[:ARGS]",
+                        help="Operation, repeatable and applied in order. "
+                             "linear_stretch:MIN,MAX  shrink:MIN,MAX  slide:OFFSET  "
+                             "piecewise:T,A,B,C,D  percentile:LOW,HIGH  equalize  spec:REF_IMAGE")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="Worker processes (default: all cores)")
+    parser.add_argument("--suffix", default="", help="Suffix added to output file names")
+    parser.add_argument("--in-place", action="store_true",
+                        help="Allow results to replace their input files")
+    args = parser.parse_args(argv)
+
+    try:
+        ops = [parse_op(s) for s in args.op]
+    except ValueError as e:
+        parser.error(str(e))
+    files = collect_inputs(args.inputs)
+    if not files:
+        parser.error("No input images found.")
+    try:
+        failures = run_batch(files, ops, args.out_dir, args.workers, args.suffix, in_place=args.in_place)
+    except ValueError as e:
+        parser.error(str(e))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
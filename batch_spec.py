@@ -0,0 +1,149 @@
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from imagecore import lut
+from imagecore.gray import ImageStats, load_gray, specification_lut, target_cdf, apply_mapping
+from batch_gray import collect_inputs, plan_outputs, check_output_depth
+
+
+def ordered_map(fn, items, workers=None, max_in_flight=None):
+    """
+    Like pool.map, but only max_in_flight items (default 2 per worker) are
+    submitted at a time, so memory stays bounded however many items there
+    are. Results are yielded in input order as (item, future).
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    window = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="spec") as pool:
+        for item in items:
+            if len(window) >= max_in_flight:
+                head = window.popleft()
+                head[1].exception()
+                yield head
+            window.append((item, pool.submit(fn, item)))
+        while window:
+            head = window.popleft()
+            head[1].exception()
+            yield head
+
+
+def reference_cdf(reference):
+    """Target CDF from a reference image or its path, computed once per batch."""
+    if isinstance(reference, str):
+        reference = load_gray(reference)
+    return target_cdf(reference)
+
+
+def specify(img, cdf_tgt):
+    """Match one uint8 image to a precomputed target CDF."""
+    return apply_mapping(img, specification_lut(ImageStats.from_image(img), cdf_tgt))
+
+
+def specify_many(images, reference, workers=None, max_in_flight=None):
+    """
+    Match every image (uint8 arrays, from any iterable) to one reference.
+    The reference histogram is taken once; results are yielded in input order.
+    """
+    cdf_tgt = reference_cdf(reference)
+    for _img, fut in ordered_map(lambda img: specify(img, cdf_tgt), images, workers, max_in_flight):
+        yield fut.result()
+
+
+def specify_file(src, dst, cdf_tgt):
+    t0 = time.perf_counter()
+    img = load_gray(src)
+    t1 = time.perf_counter()
+    res = specify(img, cdf_tgt)
+    t2 = time.perf_counter()
+    if not cv2.imwrite(dst, res):
+        raise IOError(f"Could not write {dst}")
+    t3 = time.perf_counter()
+    return img.size, t1 - t0, t2 - t1, t3 - t2
+
+
+def run_batch_spec(files, reference, out_dir, workers=None, suffix="", max_in_flight=None, log=print,
+                   in_place=False):
+    """
+    Match every file to the reference and write the results to out_dir. Each
+    worker thread decodes, matches and encodes one file; OpenCV releases the
+    GIL for all three. Files are reported in input order. Returns the number of failures.
+    Output paths are checked as in batch_gray.plan_outputs before any file is written.
+    """
+    pairs = plan_outputs(files, out_dir, suffix, in_place)
+    cdf_tgt = reference_cdf(reference)
+    # Results have the reference's depth.
+    check_output_depth(pairs, len(cdf_tgt))
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    # Parallelism comes from the files; keep OpenCV and the LUT bands from oversubscribing.
+    threads, lut_threads = cv2.getNumThreads(), lut.get_num_threads()
+    cv2.setNumThreads(1)
+    lut.set_num_threads(1)
+    total_px = failures = 0
+    start = time.perf_counter()
+    try:
+        work = lambda pair: specify_file(pair[0], pair[1], cdf_tgt)
+        for (src, _dst), fut in ordered_map(work, pairs, workers, max_in_flight):
+            try:
+                npx, t_dec, t_op, t_enc = fut.result()
+            except Exception as e:
+                failures += 1
+                log(f"FAILED {src}: {e}")
+                continue
+            total_px += npx
+            log(f"{src}: {npx / 1e6:.2f} MP  decode {t_dec * 1e3:.1f} ms  "
+                f"match {t_op * 1e3:.1f} ms  encode {t_enc * 1e3:.1f} ms")
+    finally:
+        cv2.setNumThreads(threads)
+        lut.set_num_threads(lut_threads)
+    wall = max(time.perf_counter() - start, 1e-9)
+    done = len(files) - failures
+    log(f"Matched {done}/{len(files)} files, "
+        f"{total_px / 1e6:.1f} MP in {wall:.2f} s ({done / wall:.1f} images/s, {total_px / 1e6 / wall:.1f} MP/s)")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Match the histograms of many images to one reference image.")
+    parser.add_argument("reference", help="Reference (target) image")
+    parser.add_argument("inputs", nargs="+", help="Image files, directories or glob patterns")
+    parser.add_argument("-o", "--out-dir", required=True, help="Directory for results")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="Worker threads (default: all cores)")
+    parser.add_argument("--in-flight", type=int, default=None,
+                        help="Images held in memory at once (default: 2 per worker)")
+    parser.add_argument("--suffix", default="", help="Suffix added to output file names")
+    parser.add_argument("--in-place", action="store_true",
+                        help="Allow results to replace their input files")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only print the summary")
+    args = parser.parse_args(argv)
+
+    files = collect_inputs(args.inputs)
+    if not files:
+        parser.error("No input images found.")
+    try:
+        reference = load_gray(args.reference)
+    except IOError:
+        parser.error(f"Could not read reference image {args.reference}")
+
+    def log(line):
+        if not args.quiet or line.startswith(("Matched", "FAILED")):
+            print(line)
+    try:
+        failures = run_batch_spec(files, reference, args.out_dir, args.workers, args.suffix,
+                                  args.in_flight, log, args.in_place)
+    except ValueError as e:
+        parser.error(str(e))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""
+ACE local-statistics benchmark: dense filter2D (the original implementation)
+against the box-sum engine in imagecore.ace, across window sizes.
+
+    python benchmarks/bench_ace.py --sizes 4k 8k --windows 3 11 21 51 101
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from imagecore.ace import adaptive_contrast_enhancement  # noqa: E402
+
+SIZES = {"1080p": (1080, 1920), "4k": (2160, 3840), "8k": (4320, 7680)}
+
+
+def ace_filter2d(image_np, k1=0.5, k2=0.5, window_size=11):
+    # Original implementation, kept here as the reference for speed and accuracy.
+    I = image_np.astype(np.float32) / 255.0
+    m_I = np.mean(I)
+    kernel = np.ones((window_size, window_size), np.float32) / (window_size**2)
+    m_l = cv2.filter2D(I, -1, kernel)
+    local_sq_mean = cv2.filter2D(I**2, -1, kernel)
+    sigma_l = np.sqrt(np.maximum(local_sq_mean - m_l**2, 1e-6))
+    E = k1 * (m_I / sigma_l) * (I - m_l + k2 * m_l)
+    E = np.clip(E, 0, 1)
+    return (E * 255).astype(np.uint8)
+
+
+def synthetic_image(shape, seed=0):
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (shape[0] // 16 + 1, shape[1] // 16 + 1), dtype=np.uint8)
+    img = cv2.resize(small, (shape[1], shape[0]), interpolation=cv2.INTER_CUBIC)
+    noise = rng.integers(-12, 13, shape, dtype=np.int16)
+    return np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def best_time(fn, repeat):
+    best = float("inf")
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["4k", "8k"], choices=sorted(SIZES))
+    parser.add_argument("--windows", nargs="+", type=int, default=[3, 11, 21, 51, 101])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-reference", action="store_true",
+                        help="Only time the box-sum engine (filter2D is slow at large windows)")
+    args = parser.parse_args(argv)
+
+    print(f"{'size':>6} {'window':>6} {'box ms':>9} {'MP/s':>7} {'filter2D ms':>12} "
+          f"{'speedup':>8} {'max diff':>8} {'diff px %':>9}")
+    for name in args.sizes:
+        img = synthetic_image(SIZES[name])
+        mp = img.size / 1e6
+        for w in args.windows:
+            t_box, out_box = best_time(lambda: adaptive_contrast_enhancement(img, 0.5, 0.5, w), args.repeat)
+            line = f"{name:>6} {w:>6} {t_box * 1e3:>9.1f} {mp / t_box:>7.1f}"
+            if not args.skip_reference:
+                t_ref, out_ref = best_time(lambda: ace_filter2d(img, 0.5, 0.5, w), args.repeat)
+                diff = np.abs(out_ref.astype(np.int16) - out_box)
+                line += (f" {t_ref * 1e3:>12.1f} {t_ref / t_box:>7.1f}x {int(diff.max()):>8}"
+                         f" {100.0 * np.count_nonzero(diff) / diff.size:>9.4f}")
+            print(line, flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Sustained frames per second of the cce_video.py pipeline on synthetic 1080p/4K video.
+
+    python benchmarks/bench_cce_video.py --sizes 1080p 4k --frames 120 [--with-io]
+
+Without --with-io, frames come from memory and results are discarded, so the
+figure is the enhancement throughput. With --with-io, a temporary MJPG file is
+decoded and the result is encoded again.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cce_video import run_pipeline, read_video  # noqa: E402
+
+SIZES = {"1080p": (1080, 1920), "4k": (2160, 3840)}
+
+
+def synthetic_frames(shape, count, seed=0):
+    rng = np.random.default_rng(seed)
+    h, w = shape
+    base = cv2.resize(rng.integers(20, 200, (h // 40 + 1, w // 40 + 1, 3), dtype=np.uint8),
+                      (w, h), interpolation=cv2.INTER_CUBIC)
+    for i in range(count):
+        # Slow drift in brightness so the statistics change between frames.
+        yield f"{i:06d}", cv2.add(base, (i % 40, i % 25, i % 30, 0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["1080p", "4k"], choices=sorted(SIZES))
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--smooth", type=float, default=0.2)
+    parser.add_argument("--with-io", action="store_true")
+    args = parser.parse_args(argv)
+
+    for name in args.sizes:
+        shape = SIZES[name]
+        print(f"== {name} ({shape[1]}x{shape[0]}), {args.frames} frames, smooth={args.smooth}")
+        if not args.with_io:
+            run_pipeline(synthetic_frames(shape, args.frames), lambda _n, _f: None, args.smooth)
+            continue
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "in.avi")
+            dst = os.path.join(tmp, "out.avi")
+            fourcc = cv2.VideoWriter_fourcc(*"MJPG")
+            writer = cv2.VideoWriter(src, fourcc, 30, (shape[1], shape[0]))
+            for _, frame in synthetic_frames(shape, args.frames):
+                writer.write(frame)
+            writer.release()
+            out = cv2.VideoWriter(dst, fourcc, 30, (shape[1], shape[0]))
+            frames, _fps = read_video(src)
+            try:
+                run_pipeline(frames, lambda _n, f: out.write(f), args.smooth)
+            finally:
+                out.release()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Headless benchmark suite for every enhancement kernel, with JSON results and regression checks.
+
+    python benchmarks/suite.py --sizes 256 1024 4096 -o results.json
+    python benchmarks/suite.py -o new.json --baseline results.json --threshold 0.15
+    python benchmarks/suite.py --results new.json --baseline results.json
+
+Each (kernel, size, content) case runs in a fresh interpreter, so the peak
+RSS it reports belongs to that case alone. "kernel MB" is how far the peak
+grows above the RSS once the input exists (exact on Linux). Inputs are
+synthetic and seeded, so two runs time the same pixels. No Tk window is created.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SIZES = [256, 512, 1024, 2048, 4096, 8192]
+CONTENTS = ("smooth", "noise", "low_contrast", "dark", "edges")
+
+
+def synthetic_gray(side, content, seed=0):
+    """side x side uint8 test image with a given kind of content."""
+    rng = np.random.default_rng(seed)
+    shape = (side, side)
+    if content == "noise":
+        return rng.integers(0, 256, shape, dtype=np.uint8)
+    if content == "edges":
+        # Blocks of random flat grey levels: sharp steps, few distinct values.
+        cells = rng.integers(0, 256, (side // 32 + 1, side // 32 + 1), dtype=np.uint8)
+        return np.ascontiguousarray(np.kron(cells, np.ones((32, 32), np.uint8))[:side, :side])
+    small = rng.integers(0, 256, (side // 16 + 1, side // 16 + 1), dtype=np.uint8)
+    smooth = cv2.resize(small, shape, interpolation=cv2.INTER_CUBIC)
+    if content == "smooth":
+        return smooth
+    if content == "low_contrast":
+        return (100 + smooth // 6).astype(np.uint8)
+    if content == "dark":
+        # Gamma 3: most pixels crowd the bottom of the range.
+        return ((smooth / 255.0) ** 3 * 255).astype(np.uint8)
+    raise ValueError(f"Unknown content '{content}'")
+
+
+def synthetic_rgb(side, content, seed=0):
+    return np.dstack([synthetic_gray(side, content, seed + c) for c in range(3)])
+
+
+def _ace(side, content):
+    from imagecore.ace import adaptive_contrast_enhancement
+    img = synthetic_gray(side, content)
+    return lambda: adaptive_contrast_enhancement(img, 0.5, 0.5, 11)
+
+
+def _clahe(side, content):
+    # Tile-based local equalization, the cheaper local-contrast mode next to ACE.
+    from imagecore.clahe import adaptive_equalize
+    img = synthetic_gray(side, content)
+    return lambda: adaptive_equalize(img, (8, 8), 2.0)
+
+
+def _cce(side, content):
+    from imagecore.color import color_contrast_enhancement
+    img = synthetic_rgb(side, content)
+    return lambda: color_contrast_enhancement(img)
+
+
+def _spec(side, content):
+    from imagecore.gray import apply_mapping, histogram_specification_map
+    src = synthetic_gray(side, content)
+    tgt = synthetic_gray(side, "smooth", seed=1)
+    return lambda: apply_mapping(src, histogram_specification_map(src, tgt))
+
+
+def _piecewise(side, content):
+    from imagecore.gray import piecewise_linear
+    img = synthetic_gray(side, content)
+    return lambda: piecewise_linear(img, 128, (0, 100), (160, 255))
+
+
+def _equalize16(side, content):
+    # 12-bit data in a uint16 image: 65536-bin histogram and a 65536-entry LUT.
+    from imagecore.gray import histogram_equalize
+    img = synthetic_gray(side, content).astype(np.uint16) << 4
+    return lambda: histogram_equalize(img)
+
+
+def _lut(side, content):
+    # Per-channel LUT over an RGB image into a reused buffer: the bandwidth-bound core of every point operation.
+    from imagecore.lut import apply_lut
+    img = synthetic_rgb(side, content)
+    table = np.dstack([np.arange(256, dtype=np.uint8)[::-1]] * 3)
+    out = np.empty_like(img)
+    return lambda: apply_lut(img, table, out=out)
+
+
+def _pyramid(side, content):
+    from imagecore.resample import build_pyramid
+    im = Image.fromarray(synthetic_rgb(side, content))
+    return lambda: build_pyramid(im)
+
+
+def _reduce(side, content):
+    # One slider position of the ass0.py view: reduce to 10% and render at canvas size.
+    from imagecore.resample import build_pyramid, render_reduced
+    pyramid = build_pyramid(Image.fromarray(synthetic_rgb(side, content)))
+    return lambda: render_reduced(pyramid, 10, (800, 600))
+
+
+# name -> setup(side, content) returning the callable to time
+KERNELS = {
+    "ace": _ace,
+    "clahe": _clahe,
+    "cce": _cce,
+    "spec": _spec,
+    "piecewise": _piecewise,
+    "equalize16": _equalize16,
+    "lut": _lut,
+    "pyramid": _pyramid,
+    "reduce": _reduce,
+}
+
+
+def _proc_status_mb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb():
+    peak = _proc_status_mb("VmHWM")
+    if peak is not None:
+        return peak
+    # ru_maxrss is in KiB on Linux and bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+
+def reset_peak_rss():
+    """Restart the peak-RSS count at the current RSS (Linux); returns the RSS in MB."""
+    gc.collect()
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return peak_rss_mb()
+    return _proc_status_mb("VmRSS")
+
+
+def run_case(kernel, side, content, repeat):
+    """Time one case in this process; called in the child interpreter."""
+    fn = KERNELS[kernel](side, content)
+    # Temporaries of input generation must not count as kernel memory.
+    setup_rss = reset_peak_rss()
+    fn()  # warm-up, also fills any caches a real session would have
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    mp = side * side / 1e6
+    best = min(times)
+    peak = peak_rss_mb()
+    return {
+        "kernel": kernel, "size": side, "content": content, "megapixels": mp,
+        "best_s": best, "median_s": statistics.median(times), "mp_per_s": mp / best,
+        "peak_rss_mb": peak, "kernel_rss_mb": peak - setup_rss,
+    }
+
+
+def run_isolated(kernel, side, content, repeat, threads):
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", kernel, str(side), content,
+           "--repeat", str(repeat)]
+    if threads is not None:
+        cmd += ["--threads", str(threads)]
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{kernel} {side} {content} failed:\n{proc.stderr.strip()}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def environment(args):
+    return {
+        "python": platform.python_version(), "platform": platform.platform(),
+        "cpus": os.cpu_count(), "numpy": np.__version__, "opencv": cv2.__version__,
+        "pillow": Image.__version__, "threads": args.threads, "repeat": args.repeat,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def case_key(r):
+    return r["kernel"], r["size"], r["content"]
+
+
+def compare(results, baseline, threshold):
+    """Lines describing each case against the baseline, and the number of regressions."""
+    base = {case_key(r): r for r in baseline}
+    lines, regressions = [], 0
+    for r in results:
+        old = base.get(case_key(r))
+        if old is None:
+            continue
+        time_ratio = r["best_s"] / max(old["best_s"], 1e-12)
+        # Ignore RSS noise of a few MB on the small cases.
+        rss_grew = r["kernel_rss_mb"] > old["kernel_rss_mb"] * (1 + threshold) + 4
+        flags = []
+        if time_ratio > 1 + threshold:
+            flags.append("SLOWER")
+        if rss_grew:
+            flags.append("MORE MEMORY")
+        regressions += bool(flags)
+        lines.append(f"{r['kernel']:>10} {r['size']:>5} {r['content']:>12} "
+                     f"{old['best_s'] * 1e3:>9.2f} {r['best_s'] * 1e3:>9.2f} {time_ratio:>6.2f}x "
+                     f"{old['kernel_rss_mb']:>8.1f} {r['kernel_rss_mb']:>8.1f}  {' '.join(flags)}")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--kernels", nargs="+", default=sorted(KERNELS), choices=sorted(KERNELS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[256, 1024, 4096],
+                        help=f"Square image sides, e.g. {' '.join(map(str, SIZES))}")
+    parser.add_argument("--contents", nargs="+", default=["smooth", "noise", "low_contrast"],
+                        choices=CONTENTS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=None, help="cv2.setNumThreads (and LUT threads) for every case")
+    parser.add_argument("-o", "--output", help="Write results to this JSON file")
+    parser.add_argument("--results", help="Load results from this JSON file instead of running")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown (or RSS growth) counted as a regression")
+    parser.add_argument("--child", nargs=3, metavar=("KERNEL", "SIZE", "CONTENT"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.threads is not None:
+        from imagecore.lut import set_num_threads
+        cv2.setNumThreads(args.threads)
+        set_num_threads(args.threads)
+    if args.child:
+        kernel, side, content = args.child
+        print(json.dumps(run_case(kernel, int(side), content, args.repeat)))
+        return 0
+
+    if args.results:
+        with open(args.results) as f:
+            results = json.load(f)["results"]
+    else:
+        results = []
+        print(f"{'kernel':>10} {'size':>5} {'content':>12} {'best ms':>9} {'median ms':>10} "
+              f"{'MP/s':>8} {'peak MB':>8} {'kernel MB':>9}")
+        for kernel in args.kernels:
+            for side in args.sizes:
+                for content in args.contents:
+                    r = run_isolated(kernel, side, content, args.repeat, args.threads)
+                    results.append(r)
+                    print(f"{kernel:>10} {side:>5} {content:>12} {r['best_s'] * 1e3:>9.2f} "
+                          f"{r['median_s'] * 1e3:>10.2f} {r['mp_per_s']:>8.1f} "
+                          f"{r['peak_rss_mb']:>8.1f} {r['kernel_rss_mb']:>9.1f}", flush=True)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"environment": environment(args), "results": results}, f, indent=2)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    lines, regressions = compare(results, baseline, args.threshold)
+    print(f"\n{'kernel':>10} {'size':>5} {'content':>12} {'base ms':>9} {'new ms':>9} {'ratio':>7} "
+          f"{'base MB':>8} {'new MB':>8}")
+    print("\n".join(lines))
+    print(f"{regressions} regression(s) over {args.threshold:.0%} in {len(lines)} matched case(s)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+import argparse
+import glob
+import os
+import queue
+import re
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from imagecore.color import channel_hist, equalization_lut, range_stretch_lut
+from imagecore.gray import IDENTITY_LUT, hist_min_max
+from imagecore.lut import apply_lut
+from batch_gray import path_key
+
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+_STOP = object()
+
+
+class TemporalStats:
+    """
+    Exponentially smoothed S/L statistics across frames. With alpha=1 every
+    frame uses only its own histograms, which is exactly color_contrast_enhancement.
+    Smaller alpha damps frame-to-frame changes of the L range and the S
+    distribution, which removes flicker.
+    """
+    def __init__(self, alpha=1.0):
+        self.alpha = alpha
+        self.l_range = None
+        self.s_pdf = None
+
+    def update(self, hist_l, hist_s):
+        l_range = np.array(hist_min_max(hist_l), dtype=np.float64)
+        s_pdf = hist_s / hist_s.sum()
+        if self.l_range is None or self.alpha >= 1.0:
+            self.l_range, self.s_pdf = l_range, s_pdf
+        else:
+            a = self.alpha
+            self.l_range = a * l_range + (1 - a) * self.l_range
+            self.s_pdf = a * s_pdf + (1 - a) * self.s_pdf
+        return self.lut(exact_hist_s=hist_s if self.alpha >= 1.0 else None)
+
+    def lut(self, exact_hist_s=None):
+        lo, hi = (int(round(v)) for v in self.l_range)
+        s_lut = equalization_lut(exact_hist_s if exact_hist_s is not None else self.s_pdf)
+        return np.dstack([IDENTITY_LUT, range_stretch_lut(lo, hi), s_lut])
+
+
+def enhance_frame(frame_bgr, stats, stride=1):
+    """color_contrast_enhancement for a BGR frame, using (and updating) stats."""
+    hls = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2HLS)
+    # Statistics may be taken from every stride-th row only.
+    sample = hls[::stride] if stride > 1 else hls
+    lut = stats.update(channel_hist(sample, 1), channel_hist(sample, 2))
+    apply_lut(hls, lut, out=hls)
+    return cv2.cvtColor(hls, cv2.COLOR_HLS2BGR, dst=frame_bgr)
+
+
+def _natural_key(path):
+    return [int(t) if t.isdigit() else t for t in re.split(r"(\d+)", path)]
+
+
+def is_sequence(source):
+    return os.path.isdir(source) or any(c in source for c in "*?[")
+
+
+def list_frames(source):
+    if os.path.isdir(source):
+        files = [os.path.join(source, f) for f in os.listdir(source) if f.lower().endswith(IMAGE_EXTS)]
+    else:
+        files = glob.glob(source)
+    return sorted(files, key=_natural_key)
+
+
+def check_frame_outputs(files, out_dir):
+    """
+    Raise ValueError, before anything is written, if a result would replace an
+    input frame or two frames (same name from different folders) would be
+    written to one file. Same rules as batch_gray.plan_outputs.
+    """
+    inputs = {path_key(f) for f in files}
+    targets = {}
+    for src in files:
+        dst = os.path.join(out_dir, os.path.basename(src))
+        key = path_key(dst)
+        if key in targets:
+            raise ValueError(f"{targets[key]} and {src} would both be written to {dst}")
+        if key in inputs:
+            raise ValueError(f"{dst} would overwrite an input frame; choose another output directory")
+        targets[key] = src
+
+
+def read_video(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+
+    def frames():
+        try:
+            while True:
+                ok, frame = cap.read()
+                if not ok:
+                    return
+                yield None, frame
+        finally:
+            cap.release()
+    return frames(), fps
+
+
+def read_sequence(files):
+    for path in files:
+        frame = cv2.imread(path, cv2.IMREAD_COLOR)
+        if frame is None:
+            raise IOError(f"Could not read frame {path}")
+        yield os.path.basename(path), frame
+
+
+def _stage(fn, inbox, outbox, busy, key, errors):
+    t = 0.0
+    try:
+        while True:
+            item = inbox.get()
+            if item is _STOP:
+                break
+            t0 = time.perf_counter()
+            result = fn(item)
+            t += time.perf_counter() - t0
+            outbox.put(result)
+    except Exception as e:
+        errors.append(e)
+        # Drain so the upstream stage cannot block on a full queue.
+        while inbox.get() is not _STOP:
+            pass
+    finally:
+        busy[key] = t
+        outbox.put(_STOP)
+
+
+def run_pipeline(frames, write, alpha=1.0, stride=1, queue_size=8, log=print):
+    """
+    Reader -> enhancer -> writer, each on its own thread and linked by bounded
+    queues, so decoding, enhancement and encoding overlap. frames yields
+    (name, BGR frame); write is called with (name, enhanced frame) in order.
+    """
+    stats = TemporalStats(alpha)
+    decoded = queue.Queue(queue_size)
+    enhanced = queue.Queue(queue_size)
+    done = queue.Queue()
+    busy = {}
+    errors = []
+
+    def read_all():
+        t = 0.0
+        try:
+            it = iter(frames)
+            while True:
+                t0 = time.perf_counter()
+                item = next(it, _STOP)
+                t += time.perf_counter() - t0
+                if item is _STOP:
+                    break
+                decoded.put(item)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            busy["decode"] = t
+            decoded.put(_STOP)
+
+    count = [0, 0]
+
+    def write_one(item):
+        name, frame = item
+        write(name, frame)
+        count[0] += 1
+        count[1] += frame.shape[0] * frame.shape[1]
+
+    threads = [
+        threading.Thread(target=read_all, daemon=True),
+        threading.Thread(target=_stage, daemon=True,
+                         args=(lambda it: (it[0], enhance_frame(it[1], stats, stride)),
+                               decoded, enhanced, busy, "enhance", errors)),
+        threading.Thread(target=_stage, daemon=True,
+                         args=(write_one, enhanced, done, busy, "encode", errors)),
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+
+    frames_done, pixels = count
+    fps = frames_done / max(wall, 1e-9)
+    log(f"{frames_done} frames in {wall:.2f} s: {fps:.1f} fps, "
+        f"{pixels / 1e6 / max(wall, 1e-9):.1f} MP/s")
+    log("stage busy time: " + ", ".join(f"{k} {busy.get(k, 0.0):.2f} s"
+                                        for k in ("decode", "enhance", "encode")))
+    return frames_done, fps
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Color contrast enhancement for videos and numbered frame sequences.")
+    parser.add_argument("source", help="Video file, directory of frames, or glob pattern")
+    parser.add_argument("output", help="Output video file (video input) or directory (frame input)")
+    parser.add_argument("--smooth", type=float, default=1.0, metavar="ALPHA",
+                        help="Weight of the current frame in the S/L statistics, 0 < ALPHA <= 1 "
+                             "(default 1: no temporal smoothing)")
+    parser.add_argument("--stats-stride", type=int, default=1, metavar="N",
+                        help="Take the statistics from every N-th row only")
+    parser.add_argument("--fourcc", default="mp4v", help="Codec for video output")
+    parser.add_argument("--queue-size", type=int, default=8)
+    args = parser.parse_args(argv)
+    if not 0.0 < args.smooth <= 1.0:
+        parser.error("--smooth must be in (0, 1]")
+
+    if is_sequence(args.source):
+        files = list_frames(args.source)
+        if not files:
+            parser.error("No frames found.")
+        try:
+            check_frame_outputs(files, args.output)
+        except ValueError as e:
+            parser.error(str(e))
+        os.makedirs(args.output, exist_ok=True)
+
+        def write(name, frame):
+            if not cv2.imwrite(os.path.join(args.output, name), frame):
+                raise IOError(f"Could not write {name}")
+        run_pipeline(read_sequence(files), write, args.smooth, args.stats_stride, args.queue_size)
+        return 0
+
+    if os.path.exists(args.output) and os.path.samefile(args.source, args.output):
+        parser.error(f"{args.output} is the input video; write the result to another file")
+    frames, fps = read_video(args.source)
+    writer = [None]
+
+    def write(_name, frame):
+        if writer[0] is None:
+            h, w = frame.shape[:2]
+            writer[0] = cv2.VideoWriter(args.output, cv2.VideoWriter_fourcc(*args.fourcc), fps, (w, h))
+            if not writer[0].isOpened():
+                raise IOError(f"Could not open {args.output} for writing")
+        writer[0].write(frame)
+    try:
+        run_pipeline(frames, write, args.smooth, args.stats_stride, args.queue_size)
+    finally:
+        if writer[0] is not None:
+            writer[0].release()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
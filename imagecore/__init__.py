@@ -0,0 +1,11 @@
+"""
+Image processing kernels behind the Tk apps, importable without tkinter or
+matplotlib. Submodules are imported on demand so each pays only for what it uses:
+
+    imagecore.gray      grayscale point operations, histograms, specification (ass1.py)
+    imagecore.ace       adaptive contrast enhancement (assignment2_Q1.py)
+    imagecore.clahe     tile-based adaptive histogram equalization (ass1.py)
+    imagecore.color     HLS color contrast enhancement (assignment2_Q2.py)
+    imagecore.resample  pyramid-based resolution reduction and channel views (ass0.py)
+    imagecore.lut       threaded LUT application for uint8/uint16, 1-4 channels
+"""
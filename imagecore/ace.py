@@ -0,0 +1,150 @@
+"""Adaptive contrast enhancement (ACE) from box-filtered local mean and standard deviation."""
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+# Rows per strip when the tiled path walks the image.
+TILE_ROWS = 1024
+
+
+def global_mean(image_np, tile_rows=TILE_ROWS):
+    """Mean of the image on the [0, 1] scale, summed strip by strip (exact for integer input)."""
+    integer = np.issubdtype(image_np.dtype, np.integer)
+    total = 0 if integer else 0.0
+    for y0 in range(0, image_np.shape[0], tile_rows):
+        strip = image_np[y0:y0 + tile_rows]
+        if integer:
+            total += int(np.sum(strip, dtype=np.uint64))
+        else:
+            total += float(np.sum(strip, dtype=np.float64))
+    return float(total) / image_np.size / 255.0
+
+
+# Largest window whose sum of squared uint8 values still fits in int32.
+MAX_INT_WINDOW = 181
+
+
+def local_mean_std(image_np, window_size):
+    """
+    Local mean m_l and standard deviation sigma_l over a window_size x window_size
+    box, on the [0, 1] scale. Both come from running box sums, so the cost per
+    pixel does not depend on window_size. For uint8 input the sums are exact
+    integers, which makes the result independent of how the image is tiled.
+    """
+    n = float(window_size * window_size)
+    ksize = (window_size, window_size)
+    if image_np.dtype == np.uint8:
+        sum_depth = cv2.CV_32S if window_size <= MAX_INT_WINDOW else cv2.CV_64F
+        s = cv2.boxFilter(image_np, sum_depth, ksize, normalize=False)
+        q = cv2.sqrBoxFilter(image_np, sum_depth, ksize, normalize=False)
+    else:
+        src = image_np.astype(np.float64)
+        s = cv2.boxFilter(src, -1, ksize, normalize=False)
+        q = cv2.sqrBoxFilter(src, -1, ksize, normalize=False)
+        del src
+    m_l = np.multiply(s, np.float32(1.0 / (n * 255.0)), dtype=np.float32)
+    del s
+    sigma_l = np.multiply(q, np.float32(1.0 / (n * 255.0 * 255.0)), dtype=np.float32)
+    del q
+    sigma_l -= cv2.multiply(m_l, m_l)
+    np.maximum(sigma_l, np.float32(1e-6), out=sigma_l)
+    cv2.sqrt(sigma_l, dst=sigma_l)
+    return m_l, sigma_l
+
+
+def ace_from_local_stats(image_np, m_I, m_l, sigma_l, k1=0.5, k2=0.5):
+    """ACE output from precomputed global mean and local statistics (inputs are left untouched)."""
+    # E * 255 = k1 * m_I / sigma_l * (I_255 - 255 * (1 - k2) * m_l), done in three fused passes
+    E = cv2.scaleAdd(m_l, -255.0 * (1.0 - k2), image_np.astype(np.float32))
+    cv2.divide(E, sigma_l, dst=E, scale=k1 * m_I)
+    np.clip(E, 0, 255, out=E)
+    return E.astype(np.uint8)
+
+
+def adaptive_contrast_enhancement(image_np, k1=0.5, k2=0.5, window_size=11):
+    """
+    Implements ACE:
+    E(r,c) = k1 * [m_I / σ_l(r,c)] * [I(r,c) - m_l(r,c) + k2 * m_l(r,c)]
+    """
+    m_I = global_mean(image_np)
+    m_l, sigma_l = local_mean_std(image_np, window_size)
+    return ace_from_local_stats(image_np, m_I, m_l, sigma_l, k1, k2)
+
+
+def adaptive_contrast_enhancement_tiled(image_np, k1=0.5, k2=0.5, window_size=11,
+                                        tile_rows=TILE_ROWS, out=None, progress=None):
+    """
+    ACE over horizontal strips with a window_size // 2 halo, so peak memory is
+    bounded by the strip size rather than the image size. image_np may be a
+    read-only np.memmap; out may be an array, a memmap or a path, in which
+    case a .npy memmap is created there. For uint8 input the result is
+    identical to adaptive_contrast_enhancement.
+
+    progress, if given, is called with the finished fraction after each strip;
+    an exception raised from it aborts the run (used for cancellation).
+    """
+    h = image_np.shape[0]
+    if isinstance(out, str):
+        out = np.lib.format.open_memmap(out, mode="w+", dtype=np.uint8, shape=image_np.shape)
+    elif out is None:
+        out = np.empty(image_np.shape, dtype=np.uint8)
+
+    m_I = global_mean(image_np, tile_rows)
+    halo = window_size // 2
+    for y0 in range(0, h, tile_rows):
+        y1 = min(y0 + tile_rows, h)
+        a0 = max(y0 - halo, 0)
+        a1 = min(y1 + halo, h)
+        strip = np.asarray(image_np[a0:a1])
+        m_l, sigma_l = local_mean_std(strip, window_size)
+        res = ace_from_local_stats(strip, m_I, m_l, sigma_l, k1, k2)
+        out[y0:y1] = res[y0 - a0:y1 - a0]
+        if progress is not None:
+            progress(y1 / h)
+    if isinstance(out, np.memmap):
+        out.flush()
+    return out
+
+
+class LocalStatsCache:
+    """
+    Per-image local statistics keyed by window size, least recently used
+    evicted first. Each (k1, k2) variant for a cached window only needs
+    ace_from_local_stats, so results are identical to
+    adaptive_contrast_enhancement. Every window holds two float32 planes of
+    the image size, so keep max_windows small for full-resolution images.
+    """
+    def __init__(self, image_np, max_windows=4):
+        self.image = image_np
+        self.max_windows = max_windows
+        self.m_I = global_mean(image_np)
+        self._stats = OrderedDict()
+
+    def stats(self, window_size):
+        stats = self._stats.get(window_size)
+        if stats is not None:
+            self._stats.move_to_end(window_size)
+            return stats
+        stats = local_mean_std(self.image, window_size)
+        self._stats[window_size] = stats
+        while len(self._stats) > self.max_windows:
+            self._stats.popitem(last=False)
+        return stats
+
+    def enhance(self, k1=0.5, k2=0.5, window_size=11):
+        m_l, sigma_l = self.stats(window_size)
+        return ace_from_local_stats(self.image, self.m_I, m_l, sigma_l, k1, k2)
+
+
+def ace_sweep(image_np, params, max_windows=4):
+    """
+    Run ACE for every (k1, k2, window_size) in params, e.g.
+    itertools.product(k1s, k2s, windows). Local statistics are computed once
+    per window size; combinations are visited grouped by window size and
+    yielded as ((k1, k2, window_size), result).
+    """
+    cache = LocalStatsCache(image_np, max_windows)
+    for k1, k2, window_size in sorted(params, key=lambda p: p[2]):
+        yield (k1, k2, window_size), cache.enhance(k1, k2, window_size)
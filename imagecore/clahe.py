@@ -0,0 +1,118 @@
+"""
+Tile-based adaptive histogram equalization with a clip limit (CLAHE). Each tile
+gets its own equalization LUT and every pixel blends the LUTs of the four
+nearest tile centres, so the cost is a histogram pass plus four table lookups
+per pixel, whatever the tile size.
+"""
+import cv2
+import numpy as np
+
+from .gray import calc_hist, levels_for
+
+# Pixels per interpolation chunk: the index and float temporaries stay in cache.
+CHUNK_PIXELS = 1 << 16
+
+
+def tile_edges(length, n):
+    """n + 1 boundaries splitting length into n near-equal tiles."""
+    return np.linspace(0, length, n + 1).round().astype(np.int64)
+
+
+def clip_histogram(hist, limit):
+    """Clip every bin at limit and spread the excess evenly over all bins (as OpenCV's CLAHE)."""
+    levels = len(hist)
+    excess = int(np.maximum(hist - limit, 0).sum())
+    hist = np.minimum(hist, limit)
+    if excess:
+        hist += excess // levels
+        residual = excess % levels
+        if residual:
+            step = max(levels // residual, 1)
+            hist[::step][:residual] += 1
+    return hist
+
+
+def tile_equalization_luts(img, tiles=(8, 8), clip_limit=2.0):
+    """
+    float32 array (rows, cols, levels): the clipped equalization LUT of each
+    tile. Tile histograms are taken straight from views of img, so every pixel
+    is read once. clip_limit is relative to a flat histogram (<= 0: no clipping).
+    """
+    levels = levels_for(img.dtype)
+    ny, nx = tiles
+    ys, xs = tile_edges(img.shape[0], ny), tile_edges(img.shape[1], nx)
+    luts = np.empty((ny, nx, levels), dtype=np.float32)
+    for i in range(ny):
+        for j in range(nx):
+            tile = img[ys[i]:ys[i + 1], xs[j]:xs[j + 1]]
+            hist = calc_hist(tile)
+            total = max(tile.size, 1)
+            if clip_limit > 0:
+                hist = clip_histogram(hist, max(int(clip_limit * total / levels), 1))
+            luts[i, j] = np.round(np.cumsum(hist) * ((levels - 1) / total))
+    return luts
+
+
+def _centre_weights(length, n):
+    # Position of each pixel between tile centres: lower tile, upper tile, weight of the upper.
+    pos = np.arange(length, dtype=np.float32) * (n / length) - 0.5
+    lo = np.floor(pos).astype(np.int64)
+    w = (pos - lo).astype(np.float32)
+    return np.clip(lo, 0, n - 1), np.clip(lo + 1, 0, n - 1), w
+
+
+def _runs(lo, hi):
+    """(start, stop) of the stretches of pixels that share the same pair of tiles."""
+    change = np.flatnonzero((np.diff(lo) != 0) | (np.diff(hi) != 0)) + 1
+    bounds = [0, *change.tolist(), len(lo)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _lookup(block, lut):
+    # float32 LUT values for a block; cv2.LUT only takes 8-bit input.
+    if block.dtype == np.uint8:
+        return cv2.LUT(block, lut)
+    return lut[block]
+
+
+def adaptive_equalize(img, tiles=(8, 8), clip_limit=2.0, out=None):
+    """
+    CLAHE of a uint8 or uint16 grey image over a rows x cols tile grid; the
+    result has img's dtype. When the grid divides the image evenly this agrees
+    with cv2.createCLAHE(clip_limit, (cols, rows)) to within one level;
+    otherwise tiles differ in size by a pixel where OpenCV pads the image.
+    The image is walked in cells between tile centres, where the four tiles
+    are fixed, so each lookup is a whole-block LUT pass.
+    """
+    if img.ndim != 2 or img.dtype not in (np.uint8, np.uint16):
+        raise ValueError("adaptive_equalize needs a single-channel uint8 or uint16 image")
+    ny, nx = tiles
+    if ny < 1 or nx < 1 or ny > img.shape[0] or nx > img.shape[1]:
+        raise ValueError(f"Tile grid {ny}x{nx} does not fit a {img.shape[1]}x{img.shape[0]} image")
+    luts = tile_equalization_luts(img, tiles, clip_limit)
+    if out is None:
+        out = np.empty_like(img)
+
+    y0s, y1s, wy = _centre_weights(img.shape[0], ny)
+    x0s, x1s, wx = _centre_weights(img.shape[1], nx)
+    for ya, yb in _runs(y0s, y1s):
+        top, bottom = luts[y0s[ya]], luts[y1s[ya]]
+        # Along the image border both neighbours are the same tile: one lookup, no blend.
+        blend_y = y0s[ya] != y1s[ya]
+        for xa, xb in _runs(x0s, x1s):
+            x0, x1 = x0s[xa], x1s[xa]
+            w = wx[xa:xb]
+            rows = max(1, CHUNK_PIXELS // (xb - xa))
+            for y in range(ya, yb, rows):
+                y2 = min(y + rows, yb)
+                block = img[y:y2, xa:xb]
+                t = _lookup(block, top[x0])
+                if x1 != x0:
+                    t += (_lookup(block, top[x1]) - t) * w
+                if blend_y:
+                    b = _lookup(block, bottom[x0])
+                    if x1 != x0:
+                        b += (_lookup(block, bottom[x1]) - b) * w
+                    t += (b - t) * wy[y:y2, None]
+                out[y:y2, xa:xb] = np.rint(t, out=t)
+    return out
@@ -0,0 +1,50 @@
+"""Color contrast enhancement in HLS: L stretched, S equalized, both through LUTs."""
+import cv2
+import numpy as np
+
+from .gray import HIST_BAND_PIXELS, IDENTITY_LUT, hist_min_max
+from .lut import apply_lut
+
+def channel_hist(img, channel=0):
+    """Exact 256-bin histogram (int64) of one channel of a uint8 image, without copying it."""
+    rows = max(1, HIST_BAND_PIXELS // max(1, img.shape[1]))
+    hist = np.zeros(256, dtype=np.int64)
+    for y in range(0, img.shape[0], rows):
+        band = cv2.calcHist([img[y:y + rows]], [channel], None, [256], [0, 256])
+        hist += band.ravel().astype(np.int64)
+    return hist
+
+def equalization_lut(hist):
+    cdf = hist.cumsum()
+    cdf_normalized = cdf * 255 / cdf[-1]
+    return cdf_normalized.astype(np.uint8)
+
+def stretch_lut(hist):
+    return range_stretch_lut(*hist_min_max(hist))
+
+def range_stretch_lut(min_val, max_val):
+    if max_val == min_val:
+        return IDENTITY_LUT.copy()
+    stretched = (np.arange(256) - min_val) * (255.0 / (max_val - min_val))
+    return np.clip(stretched, 0, 255).astype(np.uint8)
+
+def histogram_equalization(channel):
+    return apply_lut(channel, equalization_lut(channel_hist(channel)))
+
+def histogram_stretch(channel):
+    return apply_lut(channel, stretch_lut(channel_hist(channel)))
+
+def hls_contrast_lut(hist_l, hist_s):
+    """Per-channel LUT for an H, L, S image: hue unchanged, L stretched, S equalized."""
+    return np.dstack([IDENTITY_LUT, stretch_lut(hist_l), equalization_lut(hist_s)])
+
+def color_contrast_enhancement(image_np):
+    hls = cv2.cvtColor(image_np, cv2.COLOR_RGB2HLS)
+
+    # Enhance S (Histogram Equalization) and L (Histogram Stretching) with one
+    # three-channel LUT pass, in place and without splitting the channels.
+    lut = hls_contrast_lut(channel_hist(hls, 1), channel_hist(hls, 2))
+    apply_lut(hls, lut, out=hls)
+
+    enhanced_rgb = cv2.cvtColor(hls, cv2.COLOR_HLS2RGB)
+    return enhanced_rgb
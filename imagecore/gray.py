@@ -0,0 +1,507 @@
+"""
+Grayscale point operations on uint8 and uint16 images: histograms and their
+statistics, LUT builders, histogram specification, chained operations and
+undo history. A uint16 image has a 65536-bin histogram and 65536-entry LUTs,
+so every operation is still a single LUT pass over the pixels.
+"""
+import os
+import weakref
+from collections import OrderedDict
+from functools import cached_property
+
+import cv2
+import numpy as np
+
+from .lut import apply_lut
+
+
+def to_uint8(arr):
+    a = np.asarray(arr)
+    if a.dtype == np.uint8:
+        return a
+    a = np.clip(a, 0, 255)
+    return a.astype(np.uint8)
+
+def levels_for(dtype):
+    """Number of grey levels of a uint8 (256) or uint16 (65536) image."""
+    # Byte order does not change the depth: '>u2' from a big-endian file is 16-bit too.
+    return 65536 if np.dtype(dtype).newbyteorder("=") == np.uint16 else 256
+
+def lut_dtype(levels):
+    return np.uint8 if levels <= 256 else np.uint16
+
+def to_levels(arr, levels=256):
+    # to_uint8 for any depth: clip to [0, levels-1] and truncate.
+    a = np.asarray(arr)
+    dtype = lut_dtype(levels)
+    if a.dtype == dtype:
+        return a
+    return np.clip(a, 0, levels - 1).astype(dtype)
+
+def load_gray(path):
+    # 16-bit files keep their depth; anything else becomes uint8.
+    img = cv2.imread(path, cv2.IMREAD_ANYDEPTH)
+    if img is None:
+        raise IOError("Could not read image.")
+    if img.dtype == np.uint16:
+        return img
+    return to_uint8(img)
+
+# Extensions cv2.imwrite stores at 16 bits; JPEG, BMP and WebP fall back to 8 bits by saturating.
+SIXTEEN_BIT_EXTS = (".png", ".tif", ".tiff", ".pgm", ".ppm", ".pnm", ".jp2")
+
+def holds_16bit(path):
+    return os.path.splitext(path)[1].lower() in SIXTEEN_BIT_EXTS
+
+def top_bits_uint8(img16):
+    """The top 8 of the bits img16 actually uses, as uint8, so 12-bit data is not nearly black."""
+    shift = max(int(img16.max(initial=0)).bit_length() - 8, 0)
+    return (img16 >> shift).astype(np.uint8)
+
+def save_gray(path, img):
+    # 16-bit data going to an 8-bit format keeps its top bits instead of saturating at 255.
+    if img.dtype == np.uint16 and not holds_16bit(path):
+        img = top_bits_uint8(img)
+    if not cv2.imwrite(path, img):
+        raise IOError(f"Could not write {path}")
+
+# calcHist counts in float32, which is exact only up to 2**24 per bin, so
+# large images are histogrammed in bands of at most this many pixels.
+HIST_BAND_PIXELS = 1 << 23
+
+def calc_hist(img, bins=None):
+    """Exact histogram (int64) of a uint8/uint16 image, one bin per level unless bins is given."""
+    levels = levels_for(img.dtype)
+    rows = max(1, HIST_BAND_PIXELS // max(1, img.shape[1]))
+    hist = np.zeros(bins or levels, dtype=np.int64)
+    for y in range(0, img.shape[0], rows):
+        band = cv2.calcHist([img[y:y + rows]], [0], None, [bins or levels], [0, levels])
+        hist += band.ravel().astype(np.int64)
+    return hist
+
+def rebin_hist(hist, bins):
+    """Sum a histogram into fewer, equal-width bins (e.g. 65536 -> 256 for plotting)."""
+    hist = np.asarray(hist)
+    if len(hist) == bins:
+        return hist
+    edges = np.linspace(0, len(hist), bins + 1)[:-1].astype(np.int64)
+    return np.add.reduceat(hist, edges)
+
+def cdf_from_hist(hist):
+    pdf = hist.astype(np.float64) / (np.sum(hist) + 1e-12)
+    cdf = np.cumsum(pdf)
+    return cdf
+
+
+IDENTITY_LUT = np.arange(256, dtype=np.uint8)
+LEVELS = np.arange(256, dtype=np.float32)
+_IDENTITY_LUT_16 = np.arange(65536, dtype=np.uint16)
+_LEVELS_16 = np.arange(65536, dtype=np.float32)
+for _a in (IDENTITY_LUT, LEVELS, _IDENTITY_LUT_16, _LEVELS_16):
+    _a.flags.writeable = False
+
+def identity_lut(levels=256):
+    return IDENTITY_LUT if levels <= 256 else _IDENTITY_LUT_16
+
+def level_values(levels=256):
+    # Every grey level as float32, the input of the LUT builders.
+    return LEVELS if levels <= 256 else _LEVELS_16
+
+def hist_min_max(hist):
+    nz = np.flatnonzero(hist)
+    if nz.size == 0:
+        return 0, 0
+    return int(nz[0]), int(nz[-1])
+
+def propagate_hist(hist, mapping):
+    # Histogram of apply_mapping(img, mapping) given the histogram of img.
+    return np.bincount(mapping, weights=hist, minlength=levels_for(mapping.dtype))
+
+class ImageStats:
+    """
+    Statistics of an image answered from its full-resolution histogram (256 or
+    65536 bins). Each value
+    is computed on first use and then kept, so min, max, mean, CDF and any
+    number of percentiles together cost a single pass over the pixels.
+    """
+    def __init__(self, hist):
+        self.hist = hist
+        self._percentiles = {}
+
+    @classmethod
+    def from_image(cls, img):
+        return cls(calc_hist(img))
+
+    @property
+    def levels(self):
+        return len(self.hist)
+
+    @cached_property
+    def counts(self):
+        return np.rint(np.asarray(self.hist, dtype=np.float64)).astype(np.int64)
+
+    @cached_property
+    def cumulative(self):
+        return np.cumsum(self.counts)
+
+    @cached_property
+    def size(self):
+        return int(self.cumulative[-1])
+
+    @cached_property
+    def min_max(self):
+        return hist_min_max(self.counts)
+
+    @property
+    def min(self):
+        return self.min_max[0]
+
+    @property
+    def max(self):
+        return self.min_max[1]
+
+    @cached_property
+    def mean(self):
+        return float(np.dot(self.counts, np.arange(self.levels))) / max(self.size, 1)
+
+    @cached_property
+    def cdf(self):
+        return cdf_from_hist(self.hist)
+
+    def percentile(self, pct):
+        # Same result as np.percentile (linear method) over the pixels.
+        value = self._percentiles.get(pct)
+        if value is not None:
+            return value
+        if not 0 <= pct <= 100:
+            raise ValueError(f"Percentile {pct} is outside [0, 100]")
+        cum = self.cumulative
+        pos = pct / 100.0 * (self.size - 1)
+        lo_rank = int(np.floor(pos))
+        hi_rank = min(lo_rank + 1, self.size - 1)
+        v_lo = float(np.searchsorted(cum, lo_rank, side="right"))
+        v_hi = float(np.searchsorted(cum, hi_rank, side="right"))
+        frac = pos - lo_rank
+        if frac >= 0.5:
+            value = v_hi - (v_hi - v_lo) * (1 - frac)
+        else:
+            value = v_lo + (v_hi - v_lo) * frac
+        self._percentiles[pct] = value
+        return value
+
+
+# LUT builders: each returns the mapping that the matching image function
+# applies, computed from the source ImageStats only. It has one entry per level
+# of the source (256 uint8 or 65536 uint16); a dst_max/out_max of None means
+# the top level. Ranges in these parameters are levels of the image's own depth.
+def linear_stretch_lut(stats, dst_min=0, dst_max=None):
+    levels = stats.levels
+    dst_max = levels - 1 if dst_max is None else dst_max
+    ramp = level_values(levels)
+    src_min, src_max = stats.min, stats.max
+    if src_max == src_min:
+        return to_levels(np.clip(ramp, dst_min, dst_max), levels)
+    out = (ramp - float(src_min)) / (src_max - src_min) * (dst_max - dst_min) + dst_min
+    return to_levels(out, levels)
+
+def slide_lut(offset, levels=256):
+    return to_levels(np.arange(levels, dtype=np.int32) + int(offset), levels)
+
+def linear_map_lut(src_min, src_max, dst_min, dst_max, levels=256):
+    ramp = level_values(levels)
+    if src_max == src_min:
+        return to_levels(np.clip(ramp, dst_min, dst_max), levels)
+    out = (ramp - src_min) / (src_max - src_min) * (dst_max - dst_min) + dst_min
+    return to_levels(out, levels)
+
+def piecewise_linear_lut(stats, thresh, low_dst=(0,127), high_dst=(128,255)):
+    arr = level_values(stats.levels)
+    t = float(thresh)
+    out = np.zeros_like(arr)
+    src_min, src_max = float(stats.min), float(stats.max)
+    # Lower segment mapping: [src_min, t] -> low_dst
+    lo_src_lo = src_min
+    lo_src_hi = min(t, src_max)
+    mask_low = arr <= t
+    if lo_src_hi <= lo_src_lo:
+        out[mask_low] = low_dst[0]
+    else:
+        out[mask_low] = (arr[mask_low] - lo_src_lo) / (lo_src_hi - lo_src_lo) * (low_dst[1] - low_dst[0]) + low_dst[0]
+    # Upper segment mapping: (t, src_max] -> high_dst
+    hi_src_lo = max(t+1, src_min)
+    hi_src_hi = src_max
+    mask_high = arr > t
+    if hi_src_hi <= hi_src_lo:
+        out[mask_high] = high_dst[1]
+    else:
+        out[mask_high] = (arr[mask_high] - hi_src_lo) / (hi_src_hi - hi_src_lo) * (high_dst[1] - high_dst[0]) + high_dst[0]
+    return to_levels(out, stats.levels)
+
+def percentile_stretch_lut(stats, low_pct=2.0, high_pct=98.0, out_min=0, out_max=None):
+    levels = stats.levels
+    out_max = levels - 1 if out_max is None else out_max
+    lo = np.float32(stats.percentile(low_pct))
+    hi = np.float32(stats.percentile(high_pct))
+    if hi == lo:
+        return identity_lut(levels).copy()
+    out = (level_values(levels) - lo) / (hi - lo) * (out_max - out_min) + out_min
+    return to_levels(out, levels)
+
+def equalize_lut(stats):
+    # Mirrors cv2.equalizeHist (scaled to the top level for uint16), so
+    # chained and direct equalization agree.
+    levels = stats.levels
+    dtype = lut_dtype(levels)
+    counts = stats.counts
+    total = stats.size
+    if total == 0:
+        return np.zeros(levels, dtype=dtype)
+    first = stats.min
+    if counts[first] == total:
+        return np.full(levels, first, dtype=dtype)
+    # float32 only carries 24 bits, too few for the uint16 scale.
+    ftype = np.float32 if levels <= 256 else np.float64
+    scale = ftype(levels - 1) / ftype(total - counts[first])
+    cum = stats.cumulative - counts[first]
+    lut = np.rint(cum.astype(ftype) * scale)
+    lut[:first + 1] = 0
+    return to_levels(lut, levels)
+
+def specification_lut(stats, cdf_tgt):
+    cdf_src = stats.cdf
+    # For each source level r, the smallest s such that cdf_tgt[s] >= cdf_src[r]
+    # (the top level if there is none). cdf_tgt is non-decreasing, so one
+    # searchsorted answers every level at once. The result has the target's depth.
+    top = len(cdf_tgt) - 1
+    s = np.searchsorted(cdf_tgt, cdf_src, side="left")
+    return np.minimum(s, top).astype(lut_dtype(top + 1))
+
+# Target CDFs keyed by the identity of the reference array, so matching many
+# sources against one reference only pays for its histogram once. Hashing the
+# pixels would cost more than the histogram itself. Arrays are held weakly, as
+# in ass1's PreviewCache; a reference changed in place must be passed as a new
+# array, or its ImageStats given to histogram_specification_map.
+TARGET_CDF_CACHE_SIZE = 16
+_target_cdf_cache = OrderedDict()
+
+def target_cdf(target_img):
+    key = id(target_img)
+    entry = _target_cdf_cache.get(key)
+    if entry is not None and entry[0]() is target_img:
+        _target_cdf_cache.move_to_end(key)
+        return entry[1]
+    cdf = cdf_from_hist(calc_hist(target_img))
+    cdf.flags.writeable = False
+    _target_cdf_cache[key] = (weakref.ref(target_img), cdf)
+    while len(_target_cdf_cache) > TARGET_CDF_CACHE_SIZE:
+        _target_cdf_cache.popitem(last=False)
+    return cdf
+
+
+# The image functions accept the image's ImageStats when the caller already has them.
+def linear_stretch(img, dst_min=0, dst_max=None, stats=None):
+    stats = stats or ImageStats.from_image(img)
+    return apply_mapping(img, linear_stretch_lut(stats, dst_min, dst_max))
+
+def linear_map_custom(img, src_min, src_max, dst_min, dst_max):
+    return apply_mapping(img, linear_map_lut(src_min, src_max, dst_min, dst_max, levels_for(img.dtype)))
+
+def shrink_map(img, dst_min, dst_max, stats=None):
+    return linear_stretch(img, dst_min, dst_max, stats)
+
+def slide(img, offset):
+    return apply_mapping(img, slide_lut(offset, levels_for(img.dtype)))
+
+def piecewise_linear(img, thresh, low_dst=(0,127), high_dst=(128,255), stats=None):
+    stats = stats or ImageStats.from_image(img)
+    return apply_mapping(img, piecewise_linear_lut(stats, thresh, low_dst, high_dst))
+
+def percentile_hist_stretch(img, low_pct=2.0, high_pct=98.0, out_min=0, out_max=None, stats=None):
+    stats = stats or ImageStats.from_image(img)
+    return apply_mapping(img, percentile_stretch_lut(stats, low_pct, high_pct, out_min, out_max))
+
+def histogram_equalize(img):
+    if img.dtype == np.uint8:
+        return cv2.equalizeHist(img)
+    # OpenCV has no 16-bit equalizeHist; same algorithm over 65536 levels.
+    return apply_mapping(img, equalize_lut(ImageStats.from_image(img)))
+
+
+def histogram_specification_map(src_img, target_img, stats=None, target_stats=None):
+    stats = stats or ImageStats.from_image(src_img)
+    cdf_tgt = target_stats.cdf if target_stats is not None else target_cdf(target_img)
+    return specification_lut(stats, cdf_tgt)
+
+def apply_mapping(img, mapping, out=None):
+    # Banded, multi-threaded LUT pass; out may be a preallocated buffer or img itself.
+    return apply_lut(img, mapping, out)
+
+
+class GrayImage:
+    """
+    uint8/uint16 image together with its ImageStats. map() derives the result's
+    histogram from this one and the LUT (a bincount over the levels), so images produced
+    by point operations never need another pass over their pixels.
+    """
+    def __init__(self, data, stats=None):
+        self.data = data
+        self._stats = stats
+
+    @property
+    def stats(self):
+        if self._stats is None:
+            self._stats = ImageStats.from_image(self.data)
+        return self._stats
+
+    @property
+    def hist(self):
+        return self.stats.hist
+
+    def map(self, mapping):
+        return GrayImage(apply_mapping(self.data, mapping),
+                         ImageStats(propagate_hist(self.stats.hist, mapping)))
+
+
+# Chainable point operations: name -> LUT builder taking the ImageStats of the
+# image the step is applied to, followed by the step's parameters.
+POINT_OPS = {
+    "linear_stretch": linear_stretch_lut,
+    "shrink": linear_stretch_lut,
+    "slide": lambda stats, offset: slide_lut(offset, stats.levels),
+    "piecewise": piecewise_linear_lut,
+    "percentile": percentile_stretch_lut,
+    "equalize": equalize_lut,
+    "spec": specification_lut,
+}
+
+class PointChain:
+    """Sequence of point operations compiled into a single LUT.
+
+    Each step's statistics are taken from the histogram the previous steps
+    would have produced, so applying the compiled LUT once gives the same
+    image as running the operations one after another.
+    """
+    def __init__(self, ops=None):
+        self.ops = list(ops or [])
+
+    def __len__(self):
+        return len(self.ops)
+
+    def append(self, name, **params):
+        if name not in POINT_OPS:
+            raise ValueError(f"Unknown point operation '{name}'")
+        self.ops.append((name, params))
+        return self
+
+    def clear(self):
+        self.ops.clear()
+
+    def compile(self, stats):
+        lut = identity_lut(stats.levels).copy()
+        for name, params in self.ops:
+            step = POINT_OPS[name](stats, **params)
+            lut = step[lut]
+            stats = ImageStats(propagate_hist(stats.hist, step))
+        return lut
+
+    def apply(self, img, stats=None):
+        stats = stats or ImageStats.from_image(img)
+        return apply_mapping(img, self.compile(stats))
+
+class EditHistory:
+    """
+    Undo/redo for point operations on one original image. A step is stored as
+    its operation, parameters, the cumulative LUT from the original and the
+    histogram-sized stats of the result, so any position is one LUT pass away and a
+    long session costs about one image. The last few positions visited are kept
+    materialized in a small LRU.
+    """
+    def __init__(self, original, max_frames=2):
+        self.original = original
+        self.steps = []
+        self.position = 0
+        self.max_frames = max_frames
+        self._frames = OrderedDict()
+
+    def state(self, position):
+        if position == 0:
+            return identity_lut(self.original.stats.levels), self.original.stats
+        _name, _params, lut, stats = self.steps[position - 1]
+        return lut, stats
+
+    def prepare_push(self, name, **params):
+        """
+        The step push() would record and the image it produces, computed
+        without changing the history; commit_push() then records them.
+        """
+        prev_lut, prev_stats = self.state(self.position)
+        step = POINT_OPS[name](prev_stats, **params)
+        stats = ImageStats(propagate_hist(prev_stats.hist, step))
+        lut = step[prev_lut]
+        return (name, params, lut, stats), GrayImage(apply_mapping(self.original.data, lut), stats)
+
+    def commit_push(self, step, frame):
+        # A new step discards anything that could have been redone.
+        del self.steps[self.position:]
+        for pos in [p for p in self._frames if p > self.position]:
+            del self._frames[pos]
+        self.steps.append(step)
+        self.position += 1
+        self._keep(self.position, frame)
+        return frame
+
+    def push(self, name, **params):
+        return self.commit_push(*self.prepare_push(name, **params))
+
+    def can_undo(self):
+        return self.position > 0
+
+    def can_redo(self):
+        return self.position < len(self.steps)
+
+    # Positions undo(), redo() and reset() move to; at either end undo/redo stay put.
+    def undo_position(self):
+        return max(self.position - 1, 0)
+
+    def redo_position(self):
+        return min(self.position + 1, len(self.steps))
+
+    def move_to(self, position):
+        self.position = position
+        return self.current()
+
+    def undo(self):
+        return self.move_to(self.undo_position())
+
+    def redo(self):
+        return self.move_to(self.redo_position())
+
+    def reset(self):
+        # Back to the original; the steps stay available for redo.
+        return self.move_to(0)
+
+    def current(self):
+        return self.frame(self.position)
+
+    def frame(self, position):
+        """The image at a position, from the LRU or one LUT pass over the original."""
+        if position == 0:
+            return self.original
+        frame = self._frames.get(position)
+        if frame is not None:
+            self._frames.move_to_end(position)
+            return frame
+        lut, stats = self.state(position)
+        return self._keep(position, GrayImage(apply_mapping(self.original.data, lut), stats))
+
+    def _keep(self, position, frame):
+        self._frames[position] = frame
+        while len(self._frames) > self.max_frames:
+            self._frames.popitem(last=False)
+        return frame
+        lut, stats = self.state(self.position)
+        frame = GrayImage(apply_mapping(self.original.data, lut), stats)
+        self._frames[self.position] = frame
+        while len(self._frames) > self.max_frames:
+            self._frames.popitem(last=False)
+        return frame
@@ -0,0 +1,119 @@
+"""
+Lookup-table application for uint8 and uint16 images with 1-4 channels. The
+image is split into row bands run on a shared thread pool (cv2.LUT and
+np.take both release the GIL), and results can go straight into a
+caller-supplied buffer, including the input itself or a memory map.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# Bands smaller than this cost more in scheduling than they save.
+MIN_BAND_PIXELS = 1 << 18
+# uint16 lookups are done this many pixels at a time within a band.
+TAKE_CHUNK_PIXELS = 1 << 16
+
+_num_threads = os.cpu_count() or 1
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def set_num_threads(n):
+    """Threads used per apply_lut call, like cv2.setNumThreads (0 or None: all cores)."""
+    global _num_threads
+    _num_threads = max(1, n or os.cpu_count() or 1)
+
+
+def get_num_threads():
+    return _num_threads
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="lut")
+        return _pool
+
+
+def _levels(dtype):
+    if dtype == np.uint8:
+        return 256
+    if dtype == np.uint16:
+        return 65536
+    raise ValueError(f"LUTs apply to uint8 or uint16 images, not {dtype}")
+
+
+def _table(lut, levels, channels):
+    """lut as (levels,) shared by every channel or (levels, channels), e.g. from np.dstack."""
+    lut = np.asarray(lut)
+    if lut.dtype not in (np.uint8, np.uint16):
+        raise ValueError(f"LUT must be uint8 or uint16, not {lut.dtype}")
+    if lut.size == levels:
+        return lut.reshape(levels)
+    if lut.size == levels * channels and channels > 1:
+        return lut.reshape(levels, channels)
+    raise ValueError(f"LUT of shape {lut.shape} does not fit a {levels}-level image "
+                     f"with {channels} channel(s)")
+
+
+def _apply_band(src, table, dst):
+    if src.dtype == np.uint8:
+        # cv2 wants a per-channel table as a (1, 256, channels) array, and
+        # arrays it can wrap as a Mat; other strided views go through a copy.
+        table = table if table.ndim == 1 else table[np.newaxis]
+        if dst.flags.c_contiguous:
+            res = cv2.LUT(np.ascontiguousarray(src), table, dst=dst)
+            if not np.shares_memory(res, dst):
+                np.copyto(dst, res)
+        else:
+            np.copyto(dst, cv2.LUT(np.ascontiguousarray(src), table))
+    else:
+        # np.take widens the indices to intp first; doing that a few rows at a
+        # time keeps the copy in cache (about 3x faster than whole bands).
+        # mode="clip" is never hit for uint16 indices but avoids buffering the output.
+        rows = max(1, TAKE_CHUNK_PIXELS // max(1, int(np.prod(src.shape[1:]))))
+        for y in range(0, src.shape[0], rows):
+            s, d = src[y:y + rows], dst[y:y + rows]
+            if table.ndim == 1:
+                np.take(table, s, out=d, mode="clip")
+            else:
+                for c in range(table.shape[1]):
+                    np.take(table[:, c], s[..., c], out=d[..., c], mode="clip")
+
+
+def apply_lut(img, lut, out=None, threads=None):
+    """
+    out[...] = lut[img] for a uint8 or uint16 image, grey (H, W) or with 1-4
+    channels (H, W, C). lut has one entry per level of img (256 or 65536),
+    either shared by all channels or one column per channel; the result has
+    the LUT's dtype. out may be any array of that shape and dtype, including
+    img itself. Rows are split into bands across up to `threads` threads.
+    """
+    img = np.asarray(img)
+    if img.ndim not in (2, 3) or (img.ndim == 3 and not 1 <= img.shape[2] <= 4):
+        raise ValueError(f"Expected an (H, W) or (H, W, 1-4) image, got shape {img.shape}")
+    channels = img.shape[2] if img.ndim == 3 else 1
+    table = _table(lut, _levels(img.dtype), channels)
+    if out is None:
+        out = np.empty(img.shape, dtype=table.dtype)
+    elif out.shape != img.shape or out.dtype != table.dtype:
+        raise ValueError(f"out must be {img.shape} {table.dtype}, got {out.shape} {out.dtype}")
+
+    if img.size == 0:
+        return out
+    rows = img.shape[0]
+    threads = threads or _num_threads
+    bands = max(1, min(threads, rows, img.size // MIN_BAND_PIXELS))
+    if bands == 1:
+        _apply_band(img, table, out)
+        return out
+    step = -(-rows // bands)
+    futures = [_get_pool().submit(_apply_band, img[y:y + step], table, out[y:y + step])
+               for y in range(0, rows, step)]
+    for f in futures:
+        f.result()
+    return out
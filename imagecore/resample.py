@@ -0,0 +1,78 @@
+"""Display-size resampling for the spatial resolution and RGB channel views."""
+import numpy as np
+from PIL import Image
+
+
+def build_pyramid(image, min_size=8):
+    """Successive 2x box reductions of image; level 0 is the image itself."""
+    if image.mode == "P":
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+    elif image.mode == "1":
+        image = image.convert("L")
+    elif image.mode.startswith("I;16"):
+        image = image.convert("I")
+    levels = [image]
+    while min(levels[-1].size) >= 2 * min_size:
+        levels.append(levels[-1].reduce(2))
+    return levels
+
+def fit_size(size, box):
+    ratio = min(box[0] / size[0], box[1] / size[1])
+    return max(1, int(size[0] * ratio)), max(1, int(size[1] * ratio))
+
+def pyramid_level(pyramid, size):
+    """Smallest pyramid level that is still at least size in both dimensions."""
+    best = pyramid[0]
+    for level in pyramid:
+        if level.width < size[0] or level.height < size[1]:
+            break
+        best = level
+    return best
+
+def render_fit(pyramid, box):
+    # Fit the image into box, resampling from the closest level instead of full resolution.
+    # A level with 2x headroom leaves the final anti-aliasing to LANCZOS.
+    size = fit_size(pyramid[0].size, box)
+    level = pyramid_level(pyramid, (2 * size[0], 2 * size[1]))
+    return level if level.size == size else level.resize(size, Image.Resampling.LANCZOS)
+
+def render_reduced(pyramid, scale_percent, box):
+    """
+    The image reduced to scale_percent of its resolution, rendered directly at
+    the size it is shown in box. Looks like box-downsampling the original,
+    nearest-upsampling it back and fitting that to the canvas, but every
+    resample works at about display size.
+    """
+    w, h = pyramid[0].size
+    reduced = (int(w * scale_percent / 100.0), int(h * scale_percent / 100.0))
+    if reduced[0] <= 0 or reduced[1] <= 0:
+        raise ValueError("Invalid reduction percentage.")
+    size = fit_size((w, h), box)
+    if reduced[0] >= size[0] and reduced[1] >= size[1]:
+        # Still finer than the screen, so it looks like the original there.
+        return render_fit(pyramid, box)
+    # Box-averaging from a level with 4x headroom stays close to averaging the original.
+    low = pyramid_level(pyramid, (4 * reduced[0], 4 * reduced[1]))
+    if low.size != reduced:
+        low = low.resize(reduced, Image.Resampling.BOX)
+    # Blocky upsample to a whole multiple of the display size, then filter down,
+    # which keeps the anti-aliased block edges of the full-size path.
+    k = max(-(-size[0] // reduced[0]), -(-size[1] // reduced[1]))
+    blocks = low.resize((reduced[0] * k, reduced[1] * k), Image.Resampling.NEAREST)
+    return blocks.resize(size, Image.Resampling.LANCZOS)
+
+def channel_previews(pyramid, box):
+    """
+    Red, green and blue views fitted to box. The image is resized once; each
+    view is a copy of that small image with the other two channels zeroed,
+    which matches masking at full size first because LANCZOS works per band.
+    """
+    if len(pyramid[0].getbands()) < 3:
+        raise ValueError("The loaded image does not have RGB channels.")
+    small = np.asarray(render_fit(pyramid, box))[..., :3]
+    previews = []
+    for c in range(3):
+        masked = np.zeros_like(small)
+        masked[..., c] = small[..., c]
+        previews.append(Image.fromarray(masked, "RGB"))
+    return previews
@@ -0,0 +1,246 @@
+"""
+Opt-in timing of GUI actions and the stages inside them.
+
+    IMAGE_TOOLS_PROFILE=1      time every action and stage
+    IMAGE_TOOLS_PROFILE=alloc  also record peak Python/NumPy allocation per stage (tracemalloc)
+    IMAGE_TOOLS_TRACE=out.json write a Chrome trace (chrome://tracing, Perfetto) on exit
+
+When profiling is off, action() and stage() return a shared no-op object and
+traced() calls straight through, so instrumented code pays one branch.
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+MAX_EVENTS = 200000
+
+_mode = os.environ.get("IMAGE_TOOLS_PROFILE", "").strip().lower()
+ENABLED = _mode not in ("", "0", "false", "no", "off")
+TRACK_ALLOC = _mode == "alloc"
+
+_local = threading.local()
+_lock = threading.Lock()
+_events = []
+_last_action = None
+_t0 = time.perf_counter()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def record(self, *arrays):
+        pass
+
+
+_NULL = _NullSpan()
+
+
+class Span:
+    """One timed region; an action is a span with no enclosing action."""
+    def __init__(self, name, cat):
+        self.name = name
+        self.cat = cat
+        self.nbytes = 0
+        self.alloc = None
+        self.children = []
+        self.deferred = False
+        self.start = self.duration = 0.0
+        self._peak_seen = 0
+        self._alloc_base = 0
+
+    def record(self, *arrays):
+        """Count the size of arrays (or PIL images) this stage produced."""
+        for a in arrays:
+            if a is None:
+                continue
+            n = getattr(a, "nbytes", None)
+            if n is None and hasattr(a, "size") and hasattr(a, "getbands"):
+                n = a.size[0] * a.size[1] * len(a.getbands())
+            self.nbytes += n or 0
+
+    def __enter__(self):
+        stack = _stack()
+        if TRACK_ALLOC and tracemalloc.is_tracing():
+            # reset_peak() is global, so hand the peak so far to the parent first.
+            cur, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1]._peak_seen = max(stack[-1]._peak_seen, peak)
+            tracemalloc.reset_peak()
+            self._alloc_base = cur
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.duration = time.perf_counter() - self.start
+        stack = _stack()
+        stack.pop()
+        if TRACK_ALLOC and tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1], self._peak_seen)
+            self.alloc = peak - self._alloc_base
+            if stack:
+                stack[-1]._peak_seen = max(stack[-1]._peak_seen, peak)
+        global _last_action
+        if stack:
+            stack[-1].children.append(self)
+        elif self.cat == "action":
+            _last_action = self
+        elif _last_action is not None:
+            # A stage run later from the event loop (idle redraw, preview
+            # delivery) still belongs to the action that caused it.
+            self.deferred = True
+            _last_action.children.append(self)
+        _emit(self)
+        return False
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _emit(span):
+    args = {}
+    if span.nbytes:
+        args["bytes"] = span.nbytes
+    if span.alloc is not None:
+        args["alloc_peak_bytes"] = span.alloc
+    event = {"name": span.name, "cat": span.cat, "ph": "X", "pid": os.getpid(),
+             "tid": threading.get_ident(), "ts": (span.start - _t0) * 1e6,
+             "dur": span.duration * 1e6, "args": args}
+    with _lock:
+        if len(_events) < MAX_EVENTS:
+            _events.append(event)
+
+
+def enable(alloc=False):
+    """Turn profiling on at runtime (the environment variables do this at import)."""
+    global ENABLED, TRACK_ALLOC
+    ENABLED = True
+    TRACK_ALLOC = alloc
+    if alloc and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def action(name):
+    """Top-level user action (button press, slider move); stages inside it nest under it."""
+    return Span(name, "action") if ENABLED else _NULL
+
+
+def stage(name):
+    """
+    A step inside an action: decode, kernel, resize, photo, histogram... Run
+    outside any action, it is attached to the last action as "after".
+    """
+    return Span(name, "stage") if ENABLED else _NULL
+
+
+def traced(name):
+    """Decorator that runs a method as one action."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with action(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def _mb(n):
+    return f"{n / 1e6:.1f} MB"
+
+
+def format_action(span):
+    """One-line breakdown: total, then each stage with its share and output size."""
+    parts = []
+    accounted = 0.0
+    for child in span.children:
+        if not child.deferred:
+            accounted += child.duration
+        text = f"{child.name} {child.duration * 1e3:.1f} ms"
+        extra = [_mb(child.nbytes)] if child.nbytes else []
+        if child.alloc:
+            extra.append(f"peak +{_mb(child.alloc)}")
+        if child.deferred:
+            extra.append("after")
+        if extra:
+            text += f" ({', '.join(extra)})"
+        parts.append(text)
+    other = span.duration - accounted
+    if span.children and other > 0.0005:
+        parts.append(f"other {other * 1e3:.1f} ms")
+    head = f"{span.name}: {span.duration * 1e3:.1f} ms"
+    return head + (" | " + " · ".join(parts) if parts else "")
+
+
+def last_action():
+    return _last_action
+
+
+def events():
+    with _lock:
+        return list(_events)
+
+
+def export_chrome_trace(path):
+    """Write everything recorded this session in Chrome trace-event JSON."""
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events(), "displayTimeUnit": "ms"}, f)
+    return path
+
+
+def status_bar(root, poll_ms=250):
+    """
+    Label at the bottom of root showing the last action's breakdown. Does
+    nothing when profiling is off. Double-click it to save a trace.
+    """
+    if not ENABLED:
+        return None
+    import tkinter as tk
+    from tkinter import filedialog
+
+    var = tk.StringVar(value="Profiling on: waiting for an action...")
+    label = tk.Label(root, textvariable=var, anchor="w", relief=tk.SUNKEN, font=("TkFixedFont", 9))
+    label.pack(side=tk.BOTTOM, fill=tk.X)
+    shown = [None]
+
+    def refresh():
+        # Actions may finish on worker threads, so the Tk thread polls.
+        span = _last_action
+        key = (span, len(span.children)) if span is not None else None
+        if key != shown[0]:
+            shown[0] = key
+            var.set(format_action(span))
+        label.after(poll_ms, refresh)
+
+    def save(_event=None):
+        path = filedialog.asksaveasfilename(defaultextension=".json",
+                                            filetypes=[("Chrome trace", "*.json")])
+        if path:
+            export_chrome_trace(path)
+
+    label.bind("<Double-Button-1>", save)
+    label.after(poll_ms, refresh)
+    return label
+
+
+if TRACK_ALLOC:
+    tracemalloc.start()
+
+_trace_path = os.environ.get("IMAGE_TOOLS_TRACE")
+if ENABLED and _trace_path:
+    atexit.register(export_chrome_trace, _trace_path)
@@ -0,0 +1,197 @@
+"""
+Background jobs for the Tk apps. Work runs on a thread pool (NumPy and OpenCV
+release the GIL, so the UI stays responsive); results come back to the Tk
+thread through after() polling, in the order the jobs were submitted.
+"""
+import threading
+import tkinter as tk
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from tkinter import ttk
+
+import instrument
+
+
+class Cancelled(Exception):
+    """Raised inside a job's work once the job has been cancelled."""
+
+
+class Job:
+    def __init__(self, name, on_done=None, on_error=None):
+        self.name = name
+        self.on_done = on_done
+        self.on_error = on_error
+        self.fraction = None
+        self.future = None
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._committed = False
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        with self._lock:
+            # Once the job has changed shared state its result must be shown.
+            if self._committed:
+                return
+            self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def commit(self, fn, *args, **kwargs):
+        """
+        Run fn, the quick final step that changes shared state, unless the job
+        has been cancelled (then raise Cancelled). Cancel has no effect after it.
+        """
+        with self._lock:
+            if self._cancelled.is_set():
+                raise Cancelled(self.name)
+            self._committed = True
+        return fn(*args, **kwargs)
+
+    def progress(self, fraction):
+        """Progress hook for kernels (0..1). Raises Cancelled once the job is cancelled."""
+        if self._cancelled.is_set():
+            raise Cancelled(self.name)
+        self.fraction = fraction
+
+
+class JobRunner:
+    """
+    Runs jobs for one app. With the default single worker, jobs run one after
+    another in submission order, so queued edits apply in the order clicked.
+    """
+    POLL_MS = 50
+
+    def __init__(self, widget, max_workers=1):
+        self.widget = widget
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.pending = []
+        self.listeners = []
+        self.polling = False
+
+    def submit(self, name, fn, *args, on_done=None, on_error=None, with_progress=False,
+               with_commit=False, **kwargs):
+        """
+        Run fn(*args, **kwargs) in the background. with_progress passes the
+        Job as progress=job.progress, with_commit as commit=job.commit. on_done(result)
+        and on_error(exc) are called on the Tk thread; a cancelled job calls neither.
+        """
+        job = Job(name, on_done, on_error)
+        if with_progress:
+            kwargs["progress"] = job.progress
+        if with_commit:
+            kwargs["commit"] = job.commit
+
+        def run():
+            job.progress(0.0)
+            with instrument.action(name):
+                return fn(*args, **kwargs)
+
+        job.future = self.pool.submit(run)
+        self.pending.append(job)
+        self._notify()
+        if not self.polling:
+            self.polling = True
+            self.widget.after(self.POLL_MS, self.poll)
+        return job
+
+    def poll(self):
+        while self.pending and self.pending[0].future.done():
+            job = self.pending.pop(0)
+            try:
+                self._deliver(job)
+            except Exception as e:
+                # A failing callback must not stop delivery of later jobs.
+                self._report(e)
+        self._notify()
+        if self.pending:
+            self.widget.after(self.POLL_MS, self.poll)
+        else:
+            self.polling = False
+
+    def _deliver(self, job):
+        if job.cancelled:
+            return
+        try:
+            result = job.future.result()
+        except (Cancelled, CancelledError):
+            return
+        except Exception as e:
+            if job.on_error is None:
+                raise
+            job.on_error(e)
+            return
+        if job.on_done is not None:
+            job.on_done(result)
+
+    def _report(self, e):
+        self.widget.winfo_toplevel().report_callback_exception(type(e), e, e.__traceback__)
+
+    def active(self):
+        """The first job that is still running, or None."""
+        for job in self.pending:
+            if not job.future.done() and not job.cancelled:
+                return job
+        return None
+
+    def queued(self):
+        return sum(1 for job in self.pending if not job.future.done() and not job.cancelled)
+
+    def cancel_current(self):
+        job = self.active()
+        if job is not None:
+            job.cancel()
+            self._notify()
+
+    def cancel_all(self):
+        for job in self.pending:
+            job.cancel()
+        self._notify()
+
+    def add_listener(self, fn):
+        self.listeners.append(fn)
+
+    def _notify(self):
+        for fn in self.listeners:
+            fn(self)
+
+
+class JobBar(tk.Frame):
+    """Status line for a JobRunner: current job, progress and a Cancel button."""
+    def __init__(self, master, runner, **kwargs):
+        super().__init__(master, **kwargs)
+        self.text = tk.StringVar(value="Ready")
+        tk.Label(self, textvariable=self.text, anchor="w", width=40).pack(side=tk.LEFT, padx=4)
+        self.bar = ttk.Progressbar(self, length=200, maximum=100)
+        self.bar.pack(side=tk.LEFT, padx=4)
+        self.cancel_button = tk.Button(self, text="Cancel", command=runner.cancel_current, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=4)
+        self.busy = False
+        runner.add_listener(self.refresh)
+
+    def refresh(self, runner):
+        job = runner.active()
+        if job is None:
+            self.text.set("Ready")
+            self.set_busy(False)
+            self.bar.configure(mode="determinate", value=0)
+            return
+        waiting = runner.queued() - 1
+        text = job.name + ("..." if job.fraction is None or job.fraction == 0 else f" {job.fraction:.0%}")
+        self.text.set(text + (f"  (+{waiting} queued)" if waiting > 0 else ""))
+        self.set_busy(True)
+        if job.fraction:
+            self.bar.stop()
+            self.bar.configure(mode="determinate", value=100 * job.fraction)
+        elif str(self.bar.cget("mode")) != "indeterminate":
+            self.bar.configure(mode="indeterminate")
+            self.bar.start(15)
+
+    def set_busy(self, busy):
+        if busy != self.busy:
+            self.busy = busy
+            self.cancel_button.configure(state=tk.NORMAL if busy else tk.DISABLED)
+            if not busy:
+                self.bar.stop()
@@ -0,0 +1,142 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from imagecore.gray import ImageStats, apply_mapping, calc_hist, levels_for
+from batch_gray import parse_op, build_chain
+
+
+# Rows per tile when walking a memory-mapped image.
+TILE_ROWS = 2048
+
+_TIFF_DTYPES = {8: np.uint8, 16: np.uint16}
+
+
+def _tiff_memmap(path):
+    # Only uncompressed, single-channel TIFFs whose strips are stored back to
+    # back can be mapped directly; anything else has to be decoded.
+    max_pixels = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        with Image.open(path) as im:
+            tags = im.tag_v2
+            width, height = tags[256], tags[257]
+            bits = tags.get(258, (1,))[0]
+            compression = tags.get(259, 1)
+            samples = tags.get(277, 1)
+            offsets = tags.get(273)
+            counts = tags.get(279)
+            endian = getattr(tags, "_endian", "<")
+    finally:
+        Image.MAX_IMAGE_PIXELS = max_pixels
+    if compression != 1 or samples != 1 or bits not in _TIFF_DTYPES or offsets is None:
+        raise ValueError(f"{path}: only uncompressed single-channel 8/16-bit strip TIFFs can be memory-mapped")
+    for off, cnt, nxt in zip(offsets, counts, offsets[1:]):
+        if off + cnt != nxt:
+            raise ValueError(f"{path}: TIFF strips are not contiguous and cannot be memory-mapped")
+    dtype = np.dtype(_TIFF_DTYPES[bits]).newbyteorder(endian)
+    return np.memmap(path, dtype=dtype, mode="r", offset=offsets[0], shape=(height, width))
+
+
+def open_gray_memmap(path, shape=None, dtype=np.uint8, offset=0):
+    """
+    Open a grayscale image as a read-only memory map without reading it.
+    Supports .npy, raw files (shape required) and uncompressed TIFF.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        arr = np.load(path, mmap_mode="r")
+    elif ext in (".tif", ".tiff"):
+        arr = _tiff_memmap(path)
+    else:
+        if shape is None:
+            raise ValueError(f"{path}: raw input needs an explicit shape")
+        arr = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=tuple(shape))
+    if arr.ndim != 2:
+        raise ValueError(f"{path}: expected a single-channel image, got shape {arr.shape}")
+    return arr
+
+
+def create_gray_memmap(path, shape, dtype=np.uint8):
+    """Writable output map: .npy (with header) or raw for any other extension."""
+    if os.path.splitext(path)[1].lower() == ".npy":
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=tuple(shape))
+    return np.memmap(path, dtype=dtype, mode="w+", shape=tuple(shape))
+
+
+def iter_tiles(arr, tile_rows=TILE_ROWS):
+    """Yield (y0, y1, rows) strips; for a memmap each strip is read lazily when touched."""
+    for y0 in range(0, arr.shape[0], tile_rows):
+        y1 = min(y0 + tile_rows, arr.shape[0])
+        yield y0, y1, arr[y0:y1]
+
+
+def _native(tile):
+    # Reads the strip into memory; big-endian TIFF data is byte-swapped on the way.
+    return np.ascontiguousarray(tile, dtype=tile.dtype.newbyteorder("="))
+
+
+def tiled_stats(arr, tile_rows=TILE_ROWS):
+    """ImageStats of a (memory-mapped) uint8/uint16 image, accumulated one tile at a time."""
+    hist = np.zeros(levels_for(arr.dtype), dtype=np.int64)
+    for _y0, _y1, tile in iter_tiles(arr, tile_rows):
+        hist += calc_hist(_native(tile))
+    return ImageStats(hist)
+
+
+def apply_chain_tiled(src, chain, out, tile_rows=TILE_ROWS, stats=None):
+    """
+    Run a PointChain over src tile by tile into out (array or memmap). One
+    pass gathers the histogram, a second applies the compiled LUT, so memory
+    is bounded by the tile size.
+    """
+    if src.dtype.kind != "u" or src.dtype.itemsize > 2:
+        raise ValueError("tiled point operations need uint8 or uint16 input")
+    lut = chain.compile(stats or tiled_stats(src, tile_rows))
+    for y0, y1, tile in iter_tiles(src, tile_rows):
+        apply_mapping(_native(tile), lut, out=out[y0:y1])
+    if isinstance(out, np.memmap):
+        out.flush()
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Apply ass1.py point operations to a memory-mapped image larger than RAM.")
+    parser.add_argument("input", help=".npy, uncompressed .tif or raw file")
+    parser.add_argument("output", help=".npy or raw output file")
+    parser.add_argument("--op", action="append", required=True, metavar="NAME[:ARGS]",
+                        help="Operation, as in batch_gray.py; repeatable and applied in order")
+    parser.add_argument("--shape", help="H,W for raw input")
+    parser.add_argument("--offset", type=int, default=0, help="Header bytes to skip in raw input")
+    parser.add_argument("--dtype", choices=("uint8", "uint16"), default="uint8", help="Pixel type of raw input")
+    parser.add_argument("--tile-rows", type=int, default=TILE_ROWS)
+    args = parser.parse_args(argv)
+
+    try:
+        ops = [parse_op(s) for s in args.op]
+        shape = tuple(int(v) for v in args.shape.split(",")) if args.shape else None
+        src = open_gray_memmap(args.input, shape=shape, dtype=np.dtype(args.dtype), offset=args.offset)
+    except ValueError as e:
+        parser.error(str(e))
+    # The output map is created with w+, which would truncate a shared input before it is read.
+    if os.path.exists(args.output) and os.path.samefile(args.input, args.output):
+        parser.error(f"{args.output} is the input file; write the result to another path")
+
+    t0 = time.perf_counter()
+    chain = build_chain(ops)
+    stats = tiled_stats(src, args.tile_rows)
+    # Same depth as the input, unless spec matched to a reference of another depth.
+    out = create_gray_memmap(args.output, src.shape, chain.compile(stats).dtype)
+    apply_chain_tiled(src, chain, out, args.tile_rows, stats)
+    wall = time.perf_counter() - t0
+    print(f"{args.input}: {src.size / 1e6:.1f} MP in {wall:.2f} s ({src.size / 1e6 / max(wall, 1e-9):.1f} MP/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())